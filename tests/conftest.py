@@ -1,4 +1,8 @@
 import os
+import shutil
+import tempfile
+
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -37,3 +41,17 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_storage():
+    """Кэш, метрики и медиа тестов — во временном каталоге, а не в
+    рабочем дереве проекта."""
+    from django.test.utils import override_settings
+
+    from core.runner import isolated_settings
+
+    directory = tempfile.mkdtemp(prefix='yatube-tests-')
+    with override_settings(**isolated_settings(directory)):
+        yield directory
+    shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,43 @@
+import time
+
+from django.template.backends.django import DjangoTemplates
+
+from . import metrics
+
+
+class TimedTemplate:
+    """Шаблон, время отрисовки которого попадает в /metrics."""
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    @property
+    def template(self):
+        return self._wrapped.template
+
+    @property
+    def origin(self):
+        return self._wrapped.origin
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            metrics.observe(
+                'yatube_template_render_seconds',
+                {'template': self.origin.template_name or '<string>'},
+                time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, замеряющий отрисовку страниц целиком."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,230 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+@dataclass
+class _ProcessTier:
+    """L1 одного процесса: общий для всех потоков, хотя django.core.cache
+    создает экземпляр бэкенда в каждом потоке."""
+    entries: OrderedDict = field(default_factory=OrderedDict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    journal_inode: int = None
+    journal_position: int = 0
+
+
+# Ключ — (журнал, pid): процесс после fork начинает с пустого L1.
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """LRU в памяти процесса (L1) поверх общего для процессов кэша (L2).
+
+    OPTIONS:
+    SHARED — псевдоним кэша L2 в CACHES, например FileBasedCache;
+    L1_MAX_ENTRIES и L1_TIMEOUT — размер и срок жизни записей L1;
+    JOURNAL — файл журнала: каждая запись или удаление дописывает туда
+    ключ, и остальные процессы выбрасывают его из своего L1.
+    При ротации журнала L1 очищается целиком; в любом случае запись
+    L1 живет не дольше L1_TIMEOUT секунд.
+    """
+    JOURNAL_MAX_BYTES = 1024 * 1024
+    CLEAR = '*'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options['SHARED']
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.journal = options['JOURNAL']
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def tier(self):
+        key = (self.journal, os.getpid())
+        tier = _tiers.get(key)
+        if tier is None:
+            with _tiers_lock:
+                tier = _tiers.setdefault(key, _ProcessTier())
+        return tier
+
+    # L1
+
+    def _l1_get(self, key):
+        tier = self.tier
+        with tier.lock:
+            entry = tier.entries.get(key)
+            if entry is None:
+                return None
+            expires, pickled = entry
+            if expires < time.monotonic():
+                del tier.entries[key]
+                return None
+            tier.entries.move_to_end(key)
+            return pickled
+
+    def _l1_set(self, key, value, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        lifetime = self.l1_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout - time.time())
+        if lifetime <= 0:
+            self._l1_delete(key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        tier = self.tier
+        with tier.lock:
+            tier.entries[key] = (time.monotonic() + lifetime, pickled)
+            tier.entries.move_to_end(key)
+            while len(tier.entries) > self.l1_max_entries:
+                tier.entries.popitem(last=False)
+
+    def _l1_delete(self, key):
+        tier = self.tier
+        with tier.lock:
+            tier.entries.pop(key, None)
+
+    # Журнал инвалидаций
+
+    def _publish(self, key):
+        line = f'{os.getpid()} {key}\n'.encode()
+        directory = os.path.dirname(self.journal)
+        os.makedirs(directory, exist_ok=True)
+        descriptor = os.open(
+            self.journal, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(descriptor, line)
+            size = os.fstat(descriptor).st_size
+        finally:
+            os.close(descriptor)
+        if size > self.JOURNAL_MAX_BYTES:
+            # Новый файл вместо старого: читатели заметят смену inode
+            # и очистят L1 целиком.
+            descriptor, path = tempfile.mkstemp(dir=directory)
+            os.close(descriptor)
+            os.replace(path, self.journal)
+
+    def _sync(self):
+        """Выбрасывает из L1 ключи, измененные другими процессами."""
+        try:
+            stat = os.stat(self.journal)
+        except FileNotFoundError:
+            return
+        tier = self.tier
+        with tier.lock:
+            if stat.st_ino != tier.journal_inode:
+                if tier.journal_inode is not None:
+                    # Журнал ротирован: хвост старого файла потерян.
+                    tier.entries.clear()
+                tier.journal_inode = stat.st_ino
+                tier.journal_position = 0
+            if stat.st_size <= tier.journal_position:
+                return
+            with open(self.journal, 'rb') as journal:
+                journal.seek(tier.journal_position)
+                chunk = journal.read(stat.st_size - tier.journal_position)
+            complete = chunk.rfind(b'\n') + 1
+            tier.journal_position += complete
+            own_pid = str(os.getpid())
+            for line in chunk[:complete].decode().splitlines():
+                pid, _, key = line.partition(' ')
+                if pid == own_pid:
+                    continue
+                if key == self.CLEAR:
+                    tier.entries.clear()
+                else:
+                    tier.entries.pop(key, None)
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self._sync()
+        pickled = self._l1_get(full_key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        value = self.shared.get(key, self, version=version)
+        if value is self:
+            return default
+        self._l1_set(full_key, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found, missing = {}, []
+        for key in keys:
+            full_key = self.make_key(key, version)
+            self.validate_key(full_key)
+            pickled = self._l1_get(full_key)
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items():
+                self._l1_set(self.make_key(key, version), value,
+                             self.l1_timeout)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        self.shared.set(key, value, timeout, version=version)
+        self._publish(full_key)
+        self._l1_set(full_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            full_key = self.make_key(key, version)
+            self._publish(full_key)
+            self._l1_set(full_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self.shared.delete(key, version=version)
+        self._publish(full_key)
+        self._l1_delete(full_key)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        full_key = self.make_key(key, version)
+        self._publish(full_key)
+        self._l1_delete(full_key)
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def clear(self):
+        self.shared.clear()
+        self._publish(self.CLEAR)
+        tier = self.tier
+        with tier.lock:
+            tier.entries.clear()
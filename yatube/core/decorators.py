@@ -0,0 +1,18 @@
+def query_budget(max_queries):
+    """Задает view предельное число SQL-запросов на один запрос.
+
+    Лимит проверяет core.middleware.QueryBudgetMiddleware.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def read_replica(view):
+    """Разрешает view читать из реплики DATABASE_READ_ALIAS.
+
+    Маршрут выбирает core.routers.ReadReplicaRouter.
+    """
+    view.read_replica = True
+    return view
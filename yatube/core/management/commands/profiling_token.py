@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = ('Выдает сотруднику значение заголовка X-Profile: запросы с ним '
+            'профилируются ProfilingMiddleware.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, username, **options):
+        user = get_user_model().objects.filter(
+            username=username, is_staff=True, is_active=True).first()
+        if user is None:
+            raise CommandError(f'{username} не сотрудник')
+        self.stdout.write(profiling.make_token(user))
@@ -0,0 +1,170 @@
+"""Метрики в формате Prometheus, общие для всех процессов.
+
+Каждый процесс копит значения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл
+METRICS_DIR/<pid>.json; /metrics складывает файлы всех процессов.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+
+HELP = {
+    'yatube_requests_total': 'Обработанные запросы.',
+    'yatube_request_duration_seconds': 'Время обработки запроса.',
+    'yatube_sql_queries_total': 'SQL-запросы, выполненные view.',
+    'yatube_sql_duration_seconds_total': 'Время SQL-запросов view.',
+    'yatube_template_render_seconds': 'Время отрисовки шаблона страницы.',
+    'yatube_cache_requests_total': 'Обращения к кэшу страниц.',
+}
+
+
+class Registry:
+    """Счетчики и гистограммы одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = time.monotonic()
+
+    def _check_fork(self):
+        # Процесс, унаследованный через fork, начинает с нуля.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._check_fork()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (
+                    len(DURATION_BUCKETS) + 2)
+            histogram[bisect_left(DURATION_BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def dump(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value
+                             in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels),
+                               values in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        directory = settings.METRICS_DIR
+        if not directory or not (self.counters or self.histograms):
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < (
+                settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.flushed_at = now
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        data = self.dump()
+        with tempfile.NamedTemporaryFile(
+                'w', dir=path, suffix='.tmp', delete=False) as file:
+            json.dump(data, file)
+        os.replace(file.name, path / f'{self.pid}.json')
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+@receiver(setting_changed)
+def metrics_dir_changed(setting, **kwargs):
+    # Значения, накопленные для прежнего METRICS_DIR, не попадают в новый:
+    # иначе метрики тестов сбросились бы при выходе в рабочий каталог.
+    if setting == 'METRICS_DIR':
+        registry.reset()
+
+
+def inc(name, labels, value=1):
+    registry.inc(name, labels, value)
+
+
+def observe(name, labels, value):
+    registry.observe(name, labels, value)
+
+
+def collect():
+    """Сумма метрик всех процессов."""
+    registry.flush(force=True)
+    counters, histograms = {}, {}
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for position, value in enumerate(values):
+                total[position] += value
+    return counters, histograms
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def exposition():
+    """Текст для /metrics в формате Prometheus 0.0.4."""
+    counters, histograms = collect()
+    lines = []
+    described = set()
+
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, 'counter')
+        lines.append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), values in sorted(histograms.items()):
+        describe(name, 'histogram')
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS + ('+Inf',), values):
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
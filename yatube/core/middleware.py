@@ -0,0 +1,181 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+from . import metrics, profiling, routers
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """execute_wrapper, считающий выполненные SQL-запросы и их время.
+
+    Управление точками сохранения и запросы к ignored_tables не считаются.
+    """
+    TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT',
+                           'ROLLBACK TO SAVEPOINT')
+
+    def __init__(self, ignored_tables=()):
+        self.count = 0
+        self.seconds = 0.0
+        self.ignored_tables = ignored_tables
+
+    def __call__(self, execute, sql, params, many, context):
+        if (sql.startswith(self.TRANSACTION_CONTROL)
+                or any(table in sql for table in self.ignored_tables)):
+            return execute(sql, params, many, context)
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+class QueryBudgetMiddleware:
+    """Сверяет число запросов view с лимитом из @query_budget.
+
+    При QUERY_BUDGET_MODE = 'raise' превышение — исключение,
+    при 'log' — предупреждение в лог, при None middleware отключено.
+    """
+
+    def __init__(self, get_response):
+        if settings.QUERY_BUDGET_MODE is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter(settings.QUERY_BUDGET_IGNORED_TABLES)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and counter.count > budget:
+            message = (f'{request.resolver_match.view_name}: '
+                       f'{counter.count} SQL-запросов при лимите {budget}')
+            if settings.QUERY_BUDGET_MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+
+class ProfilingMiddleware:
+    """Профилирует случайную долю PROFILING_SAMPLE_RATE запросов и запросы
+    с заголовком X-Profile, подписанным для сотрудника
+    (manage.py profiling_token).
+
+    Профили пишутся в PROFILING_DIR/<имя view>/, без PROFILING_DIR
+    middleware отключено. Вне выборки стоит одно random() на запрос.
+    """
+    HEADER = 'HTTP_X_PROFILE'
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(self.HEADER)
+        requested = token is not None and profiling.token_user(
+            token, settings.PROFILING_TOKEN_MAX_AGE) is not None
+        if not (requested
+                or random.random() < settings.PROFILING_SAMPLE_RATE):
+            return self.get_response(request)
+        with profiling.RequestProfile(settings.PROFILING_DIR) as profile:
+            response = self.get_response(request)
+        match = request.resolver_match
+        try:
+            stem = profile.save(match.view_name if match else 'unresolved')
+        except OSError:
+            logger.exception('Не удалось сохранить профиль запроса')
+            return response
+        if requested:
+            response['X-Profile'] = stem.name
+        return response
+
+
+class MetricsMiddleware:
+    """Считает запросы, их время и SQL по view для /metrics.
+
+    Без METRICS_DIR middleware отключено.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = {'view': match.view_name if match else 'unresolved'}
+        metrics.inc('yatube_requests_total', dict(
+            view, method=request.method, status=response.status_code))
+        metrics.observe('yatube_request_duration_seconds', view, elapsed)
+        metrics.inc('yatube_sql_queries_total', view, counter.count)
+        metrics.inc('yatube_sql_duration_seconds_total', view,
+                    counter.seconds)
+        metrics.registry.flush()
+        return response
+
+
+class ReadReplicaMiddleware:
+    """Включает чтение из реплики для view с @read_replica.
+
+    После записи клиент REPLICA_PIN_SECONDS секунд читает из default,
+    чтобы видеть свои изменения. Если реплика отказала посреди запроса,
+    view повторяется на default. Без DATABASE_READ_ALIAS middleware
+    отключено.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_READ_ALIAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.state.__dict__.clear()
+        try:
+            with routers.replica_errors():
+                response = self.get_response(request)
+            if getattr(routers.state, 'wrote', False):
+                response.set_cookie(
+                    routers.PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+            return response
+        finally:
+            routers.state.__dict__.clear()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routers.state.use_replica = (
+            getattr(view_func, 'read_replica', False)
+            and routers.PIN_COOKIE not in request.COOKIES)
+        request.replica_view = view_func, view_args, view_kwargs
+
+    def process_exception(self, request, exception):
+        if not (isinstance(exception, DatabaseError)
+                and getattr(routers.state, 'replica_failed', False)):
+            return None
+        routers.mark_unavailable(settings.DATABASE_READ_ALIAS)
+        routers.state.use_replica = routers.state.replica_failed = False
+        view_func, view_args, view_kwargs = request.replica_view
+        return view_func(request, *view_args, **view_kwargs)
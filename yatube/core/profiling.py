@@ -0,0 +1,95 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+
+TOKEN_SALT = 'core.profiling'
+
+
+def make_token(user):
+    """Подписанное значение заголовка профилирования для сотрудника."""
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def token_user(token, max_age):
+    """Сотрудник, выпустивший token, или None для чужой/старой подписи."""
+    try:
+        user_id = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(
+        pk=user_id, is_staff=True, is_active=True).first()
+
+
+class StackSampler:
+    """Снимает стек потока каждые interval секунд в фоновом потоке.
+
+    Результат — свернутые стеки в формате flamegraph.pl:
+    «корень;...;лист количество».
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} '
+                             f'({os.path.basename(code.co_filename)}'
+                             f':{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """cProfile и сэмплер стека на время одного запроса."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler()
+
+    def __enter__(self):
+        self.sampler.__enter__()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.sampler.__exit__(*exc_info)
+
+    def save(self, view_name):
+        """Пишет .pstats и .collapsed в подкаталог view; возвращает путь
+        без расширения."""
+        directory = self.directory / view_name.replace(':', '.')
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = directory / f'{time.time_ns()}-{os.getpid()}'
+        self.profiler.dump_stats(f'{stem}.pstats')
+        Path(f'{stem}.collapsed').write_text(self.sampler.collapsed())
+        return stem
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.utils import ConnectionDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+# Cookie клиента, который недавно писал: он читает из default.
+PIN_COOKIE = 'replica_pin'
+
+# Состояние маршрутизации текущего запроса; заполняет
+# core.middleware.ReadReplicaMiddleware.
+state = threading.local()
+
+_unavailable_until = {}
+
+
+def replica_available(alias):
+    """Проверяет реплику не чаще раза в REPLICA_RETRY_SECONDS после сбоя."""
+    if _unavailable_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connection = connections[alias]
+        connection.ensure_connection()
+        # Курсор драйвера, мимо execute_wrapper: проверка не попадает
+        # в @query_budget и метрики.
+        with connection.wrap_database_errors:
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+            finally:
+                cursor.close()
+    except (ConnectionDoesNotExist, DatabaseError):
+        mark_unavailable(alias)
+        return False
+    return True
+
+
+def mark_unavailable(alias):
+    logger.warning('Реплика %s недоступна, чтение идет из %s',
+                   alias, DEFAULT_DB_ALIAS)
+    _unavailable_until[alias] = (
+        time.monotonic() + settings.REPLICA_RETRY_SECONDS)
+
+
+def replica_alias():
+    """Псевдоним реплики для чтения в текущем запросе или None."""
+    alias = settings.DATABASE_READ_ALIAS
+    if not (alias and getattr(state, 'use_replica', False)):
+        return None
+    if getattr(state, 'checked_alias', None) != alias:
+        if not replica_available(alias):
+            state.use_replica = False
+            return None
+        state.checked_alias = alias
+    return alias
+
+
+def _record_replica_error(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except DatabaseError:
+        # Соединение реплики может совпадать с default: ошибка считается
+        # ошибкой реплики, только если запрос шел по маршруту чтения из нее.
+        if getattr(state, 'use_replica', False):
+            state.replica_failed = True
+        raise
+
+
+@contextmanager
+def replica_errors():
+    """Отмечает в state.replica_failed упавший запрос к реплике."""
+    alias = settings.DATABASE_READ_ALIAS
+    if alias not in connections.databases:
+        yield
+        return
+    with connections[alias].execute_wrapper(_record_replica_error):
+        yield
+
+
+@contextmanager
+def primary():
+    """Чтение внутри блока идет в default и во view с @read_replica.
+
+    Для ответов, которые переживут запрос, например страниц в кэше
+    поколения: отстающая реплика не должна попасть в них для всех
+    клиентов.
+    """
+    previous = getattr(state, 'use_replica', False)
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = previous and not getattr(state, 'wrote', False)
+
+
+class ReadReplicaRouter:
+    """Чтение в view с @read_replica идет в DATABASE_READ_ALIAS.
+
+    Запись всегда идет в default и до конца запроса переключает
+    на default и чтение.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state.use_replica = False
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика получает схему репликацией, а не миграциями.
+        return (db == DEFAULT_DB_ALIAS
+                or db != settings.DATABASE_READ_ALIAS)
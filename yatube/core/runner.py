@@ -0,0 +1,47 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolated_settings(directory):
+    """Настройки, которые переносят файловый кэш, метрики и медиа
+    в directory."""
+    caches = copy.deepcopy(settings.CACHES)
+    for params in caches.values():
+        for options in (params, params.get('OPTIONS', {})):
+            for name in ('LOCATION', 'JOURNAL'):
+                path = options.get(name)
+                if path and path.startswith(settings.CACHE_DIR):
+                    options[name] = os.path.join(
+                        directory, os.path.relpath(path, settings.CACHE_DIR))
+    return {
+        'CACHE_DIR': directory,
+        'CACHES': caches,
+        'METRICS_DIR': os.path.join(directory, 'metrics'),
+        'MEDIA_ROOT': os.path.join(directory, 'media'),
+    }
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    """Тесты пишут кэш, метрики и медиа в свой временный каталог: рабочий
+    кэш не очищается, а прогоны не зависят от оставшихся в нем записей.
+
+    Для py.test то же делает фикстура в tests/conftest.py.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp(prefix='yatube-tests-')
+        self.isolated = override_settings(
+            **isolated_settings(self.directory))
+        self.isolated.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import TwoTierCache
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two_tier_test',
+    },
+})
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.params = {'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_TIMEOUT': 60,
+            'JOURNAL': os.path.join(directory, 'journal'),
+        }}
+        self.cache = TwoTierCache(None, self.params)
+        self.cache.clear()
+
+    def other_process(self, pid=-1):
+        """Тот же бэкенд, как будто в другом процессе."""
+        return mock.patch('core.cache.os.getpid', return_value=pid)
+
+    def test_l1_serves_without_shared_cache(self):
+        """Повторное чтение не обращается к L2."""
+        self.cache.set('key', 'value')
+        with mock.patch.object(TwoTierCache, 'shared') as shared:
+            self.assertEqual(self.cache.get('key'), 'value')
+        shared.get.assert_not_called()
+
+    def test_other_process_reads_shared_value(self):
+        """Другой процесс берет значение из L2."""
+        self.cache.set('key', 'value')
+        with self.other_process():
+            self.assertEqual(
+                TwoTierCache(None, self.params).get('key'), 'value')
+
+    def test_write_invalidates_other_processes(self):
+        """Запись и удаление в одном процессе сбрасывают L1 других."""
+        self.cache.set('key', 'old')
+        with self.other_process():
+            other = TwoTierCache(None, self.params)
+            self.assertEqual(other.get('key'), 'old')
+        self.cache.set('key', 'new')
+        with self.other_process():
+            self.assertEqual(other.get('key'), 'new')
+        self.cache.delete('key')
+        with self.other_process():
+            self.assertIsNone(other.get('key'))
+
+    def test_journal_rotation_clears_l1(self):
+        """После ротации журнала L1 других процессов очищается."""
+        with self.other_process():
+            other = TwoTierCache(None, self.params)
+            other.set('key', 'old')
+        self.assertEqual(self.cache.get('key'), 'old')
+        with mock.patch.object(TwoTierCache, 'JOURNAL_MAX_BYTES', 0):
+            with self.other_process():
+                other.set('another', 'value')
+        # Запись мимо журнала: узнать о ней можно только из ротации.
+        self.cache.shared.set('key', 'new')
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_l1_is_bounded(self):
+        """L1 вытесняет давно не читанные ключи."""
+        self.params['OPTIONS']['L1_MAX_ENTRIES'] = 2
+        cache = TwoTierCache(None, self.params)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(
+            list(cache.tier.entries),
+            [cache.make_key('b'), cache.make_key('c')])
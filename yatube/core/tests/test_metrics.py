@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.template.loader import select_template
+from django.test import TestCase
+from django.urls import reverse
+
+from core import metrics
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        metrics.registry.reset()
+
+    def scrape(self, **extra):
+        return self.client.get(reverse('metrics'), **extra)
+
+    def test_metrics_cover_views_sql_templates_and_cache(self):
+        """/metrics отдает запросы, SQL, шаблоны и попадания в кэш."""
+        with self.settings(METRICS_DIR=self.directory):
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+            text = self.scrape().content.decode()
+        for line in (
+            'yatube_requests_total{method="GET",status="200",'
+            'view="posts:index"} 2',
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            'yatube_cache_requests_total{cache="index_page",'
+            'result="hit"} 1',
+            'yatube_cache_requests_total{cache="index_page",'
+            'result="miss"} 1',
+            'yatube_template_render_seconds_count'
+            '{template="posts/index.html"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+        self.assertIn('yatube_sql_queries_total{view="posts:index"}', text)
+
+    def test_metrics_sum_worker_processes(self):
+        """Счетчики других процессов складываются с текущими."""
+        labels = [['method', 'GET'], ['status', 200],
+                  ['view', 'posts:index']]
+        with open(os.path.join(self.directory, '1.json'), 'w') as file:
+            json.dump({'counters': [
+                ['yatube_requests_total', labels, 5]], 'histograms': []},
+                file)
+        with self.settings(METRICS_DIR=self.directory):
+            self.client.get(reverse('posts:index'))
+            text = self.scrape().content.decode()
+            self.assertEqual(
+                self.scrape(REMOTE_ADDR='10.0.0.1').status_code, 403)
+        self.assertIn(
+            'yatube_requests_total{method="GET",status="200",'
+            'view="posts:index"} 6', text)
+
+    def test_timed_template_exposes_backend_template(self):
+        """Обертка для замеров не скрывает template и origin шаблона."""
+        template = select_template(['posts/index.html'])
+        self.assertIn('{% extends', template.template.source)
+        self.assertEqual(template.origin.template_name, 'posts/index.html')
@@ -0,0 +1,58 @@
+import pstats
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from faker import Faker
+
+from core import profiling
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.staff = User.objects.create_user(
+            username=fake.user_name(), is_staff=True)
+        cls.user = User.objects.create_user(
+            username=fake.user_name())
+
+    def setUp(self):
+        self.profiles = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles, ignore_errors=True)
+
+    def saved(self, view_name):
+        return sorted(Path(self.profiles, view_name).glob('*'))
+
+    def test_sampled_request_writes_profiles(self):
+        """Запрос из выборки оставляет pstats и свернутые стеки."""
+        with self.settings(PROFILING_DIR=self.profiles,
+                           PROFILING_SAMPLE_RATE=1):
+            response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('X-Profile', response)
+        stats_file, collapsed_file = self.saved('posts.index')[::-1]
+        self.assertEqual(stats_file.suffix, '.pstats')
+        self.assertGreater(pstats.Stats(str(stats_file)).total_calls, 0)
+        self.assertEqual(collapsed_file.suffix, '.collapsed')
+
+    def test_signed_header_profiles_staff_requests(self):
+        """Профилируются только запросы с подписью сотрудника."""
+        url = reverse('posts:index')
+        with self.settings(PROFILING_DIR=self.profiles):
+            self.client.get(url)
+            self.client.get(url, HTTP_X_PROFILE=profiling.make_token(
+                ProfilingMiddlewareTests.user))
+            self.client.get(url, HTTP_X_PROFILE='forged')
+            self.assertEqual(self.saved('posts.index'), [])
+            response = self.client.get(
+                url, HTTP_X_PROFILE=profiling.make_token(
+                    ProfilingMiddlewareTests.staff))
+        self.assertEqual(len(self.saved('posts.index')), 2)
+        self.assertTrue(Path(
+            self.profiles, 'posts.index',
+            response['X-Profile'] + '.pstats').exists())
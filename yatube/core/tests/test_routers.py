@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import (IntegrityError, OperationalError, connection,
+                       transaction)
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from faker import Faker
+
+from core import routers
+from core.decorators import read_replica
+from core.middleware import ReadReplicaMiddleware
+from posts import cache as post_cache
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ReadReplicaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username=Faker().user_name())
+
+    def setUp(self):
+        self.addCleanup(routers._unavailable_until.clear)
+        self.read_from = []
+        self.replica_view = read_replica(
+            lambda request: self.read_view(request))
+
+    def run_view(self, view, **cookies):
+        """Прогоняет view через ReadReplicaMiddleware как обработчик Django."""
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            try:
+                return view(request)
+            except Exception as error:
+                response = middleware.process_exception(request, error)
+                if response is None:
+                    raise
+                return response
+
+        middleware = ReadReplicaMiddleware(get_response)
+        factory = RequestFactory()
+        for name, value in cookies.items():
+            factory.cookies[name] = value
+        return middleware(factory.get('/'))
+
+    def read_view(self, request):
+        self.read_from.append(routers.replica_alias())
+        list(Post.objects.all())
+        return HttpResponse()
+
+    @override_settings(DATABASE_READ_ALIAS='default')
+    def test_reads_go_to_replica_until_client_writes(self):
+        """Чтение идет в реплику, запись и недавно писавший — в default."""
+        response = self.run_view(self.replica_view)
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+        @read_replica
+        def write_view(request):
+            self.read_from.append(routers.replica_alias())
+            Post.objects.create(author=ReadReplicaTests.author, text='Пост')
+            self.read_from.append(routers.replica_alias())
+            return HttpResponse()
+
+        response = self.run_view(write_view)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.run_view(self.replica_view, **{routers.PIN_COOKIE: '1'})
+        self.run_view(self.read_view)
+        self.assertEqual(self.read_from,
+                         ['default', 'default', None, None, None])
+
+    @override_settings(DATABASE_READ_ALIAS='missing')
+    def test_unavailable_replica_falls_back_to_default(self):
+        """Недоступная реплика не ломает страницу."""
+        self.run_view(self.replica_view)
+        self.assertEqual(self.read_from, [None])
+        self.assertIn('missing', routers._unavailable_until)
+
+    @override_settings(DATABASE_READ_ALIAS='default')
+    def test_replica_failure_retries_on_default(self):
+        """Ошибка реплики посреди запроса повторяет view на default."""
+        def replica_is_gone(execute, sql, params, many, context):
+            if len(self.read_from) == 1:
+                raise OperationalError('replica is gone')
+            return execute(sql, params, many, context)
+
+        @read_replica
+        def flaky_view(request):
+            with connection.execute_wrapper(replica_is_gone):
+                return self.read_view(request)
+
+        self.assertEqual(self.run_view(flaky_view).status_code, 200)
+        self.assertEqual(self.read_from, ['default', None])
+
+    @override_settings(DATABASE_READ_ALIAS='default')
+    def test_primary_failure_is_not_replica_failure(self):
+        """Ошибка запроса к default после чтения из реплики не помечает
+        реплику недоступной и не повторяет view."""
+        @read_replica
+        def duplicate_view(request):
+            self.read_view(request)
+            with transaction.atomic():
+                User.objects.create_user(
+                    username=ReadReplicaTests.author.username)
+
+        with self.assertRaises(IntegrityError):
+            self.run_view(duplicate_view)
+        self.assertEqual(self.read_from, ['default'])
+        self.assertNotIn('default', routers._unavailable_until)
+
+    @override_settings(DATABASE_READ_ALIAS='default')
+    def test_cache_filling_render_reads_default(self):
+        """Страница для кэша поколения собирается из default: отстающая
+        реплика не попадет в кэш до следующей смены поколения."""
+        cache.clear()
+        view = read_replica(post_cache.cache_page_generation(
+            60, key_prefix='replica-test')(self.read_view))
+        self.run_view(view)
+        self.run_view(view)
+        self.run_view(self.replica_view)
+        self.assertEqual(self.read_from, [None, 'default'])
+
+    @override_settings(DATABASE_READ_ALIAS='default')
+    def test_json_feed_body_reads_default(self):
+        """Тело JSON-ленты под ETag поколения читается из default."""
+        self.client.get(reverse('posts:api_index'))
+        with mock.patch.object(post_cache.routers, 'primary',
+                               wraps=routers.primary) as primary:
+            self.client.get(reverse('posts:api_index'))
+        primary.assert_called_once_with()
@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core import metrics
+
+
+class TestRunnerIsolationTest(SimpleTestCase):
+    def test_tests_do_not_touch_working_cache_and_metrics(self):
+        """Тесты пишут файловый кэш и метрики во временный каталог."""
+        for path in (settings.CACHE_DIR, settings.METRICS_DIR,
+                     caches['shared']._dir,
+                     caches['default'].journal):
+            with self.subTest(path=path):
+                self.assertFalse(path.startswith(settings.BASE_DIR))
+
+    def test_metrics_do_not_outlive_metrics_dir_override(self):
+        """Метрики, накопленные под другим METRICS_DIR, не сбрасываются
+        при выходе в рабочий каталог."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(METRICS_DIR=directory):
+            metrics.inc('yatube_requests_total', {'view': 'test'})
+        metrics.registry.flush(force=True)
+        self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(metrics.registry.dump()['counters'], [])
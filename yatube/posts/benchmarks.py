@@ -0,0 +1,156 @@
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.middleware import QueryCounter
+
+from .models import Group, Post, UserStats
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'benchmarks' / 'views.json'
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, round(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(timings, queries, sizes):
+    milliseconds = [timing * 1000 for timing in timings]
+    return {
+        'p50_ms': round(percentile(milliseconds, 50), 3),
+        'p95_ms': round(percentile(milliseconds, 95), 3),
+        'p99_ms': round(percentile(milliseconds, 99), 3),
+        'mean_ms': round(statistics.mean(milliseconds), 3),
+        'queries': max(queries),
+        'bytes': max(sizes),
+    }
+
+
+def bench_objects():
+    """Самые нагруженные объекты засеянной базы: на них и меряем."""
+    reader = UserStats.objects.select_related('user').order_by(
+        '-following_count').first()
+    author = UserStats.objects.select_related('user').order_by(
+        '-posts_count').first()
+    group = Group.objects.order_by('-posts_count').first()
+    post = Post.objects.order_by('-comments_count').first()
+    if not (reader and author and group and post):
+        raise BenchmarkError(
+            'База пуста: сначала выполните manage.py seed_bench.')
+    return {'reader': reader.user, 'author': author.user,
+            'group': group, 'post': post}
+
+
+def scenarios(objects):
+    """Сценарии: имя → (метод, адрес, данные формы, нужен ли вход)."""
+    group, post = objects['group'], objects['post']
+    return {
+        'index': ('get', reverse('posts:index'), None, False),
+        'group_posts': ('get', reverse(
+            'posts:group_posts', kwargs={'slug': group.slug}), None, False),
+        'profile': ('get', reverse(
+            'posts:profile', args=(objects['author'].username,)),
+            None, False),
+        'post_detail': ('get', reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk}), None, False),
+        'follow_index': ('get', reverse('posts:follow_index'), None, True),
+        'post_create': ('post', reverse('posts:post_create'),
+                        {'text': 'Запись из бенчмарка', 'group': group.pk},
+                        True),
+        'add_comment': ('post', reverse(
+            'posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий из бенчмарка'}, True),
+    }
+
+
+def measure(client, method, url, data, iterations, warmup, use_cache):
+    """Прогоняет запрос iterations раз; изменения БД откатываются."""
+    timings, queries, sizes = [], [], []
+    for iteration in range(warmup + iterations):
+        if not use_cache:
+            for cache in caches.all():
+                cache.clear()
+        counter = QueryCounter()
+        with transaction.atomic(), ExitStack() as stack:
+            stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if response.status_code not in (200, 302):
+            raise BenchmarkError(f'{url}: ответ {response.status_code}')
+        if iteration >= warmup:
+            timings.append(elapsed)
+            queries.append(counter.count)
+            sizes.append(len(response.content))
+    return summarize(timings, queries, sizes)
+
+
+@override_settings(DEBUG=False)
+def run(names=None, iterations=50, warmup=5, use_cache=False):
+    """Меряет сценарии names как в боевом режиме: без DEBUG,
+    отладочной панели и журнала запросов."""
+    objects = bench_objects()
+    anonymous, reader = Client(), Client()
+    reader.force_login(objects['reader'])
+    results = {}
+    for name, (method, url, data, login) in scenarios(objects).items():
+        if names and name not in names:
+            continue
+        results[name] = measure(reader if login else anonymous,
+                                method, url, data,
+                                iterations, warmup, use_cache)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Список регрессий относительно baseline.
+
+    Время (p95) и размер ответа сравниваются с допуском threshold,
+    число SQL-запросов — строго.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} → {current["p95_ms"]} мс')
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} → '
+                f'{current["queries"]}')
+        if current['bytes'] > previous['bytes'] * (1 + threshold):
+            regressions.append(
+                f'{name}: ответ {previous["bytes"]} → {current["bytes"]} байт')
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(results, indent=2, ensure_ascii=False, sort_keys=True)
+        + '\n')
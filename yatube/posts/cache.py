@@ -0,0 +1,243 @@
+import hashlib
+import math
+import os
+import random
+import time
+from contextlib import suppress
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_cache_key, has_vary_header,
+                                learn_cache_key, patch_response_headers)
+
+from core import metrics, routers
+
+GENERATION_KEY = 'generation:{}'
+
+# Сколько после срока страница еще хранится, чтобы отдавать ее,
+# пока другой запрос собирает новую.
+STALE_TIME = 60 * 10
+# Предельное время пересборки: потом блокировку может взять другой запрос.
+LOCK_TIMEOUT = 30
+LOCK_DIR = 'locks'
+# Сколько запрос без копии страницы ждет, пока ее соберет другой.
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+# Больше — раньше и чаще досрочные пересборки.
+EARLY_REFRESH_BETA = 1.0
+
+INDEX_PAGE = 'index_page'
+GROUP_FEED = 'group_feed:{}'
+AUTHOR_FEED = 'author_feed:{}'
+FOLLOW_FEED = 'follow_feed:{}'
+
+
+def get_generation(name):
+    """Текущее поколение кэша name.
+
+    Если ключ вытеснен, начинается новое поколение со значением
+    текущего времени: старые ключи страниц при этом не переиспользуются.
+    """
+    key = GENERATION_KEY.format(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def generation_time(name):
+    """Момент последней смены поколения name."""
+    return datetime.fromtimestamp(
+        get_generation(name) / 10 ** 9, tz=timezone.utc)
+
+
+def author_generations(author_id, group_ids=()):
+    """Поколения лент, в которых видны посты автора из групп group_ids."""
+    names = {INDEX_PAGE, AUTHOR_FEED.format(author_id)}
+    names.update(GROUP_FEED.format(group_id) for group_id in group_ids
+                 if group_id is not None)
+    return names
+
+
+def post_generations(post, *group_ids):
+    """Поколения лент, в которых виден пост."""
+    return author_generations(post.author_id, (post.group_id,) + group_ids)
+
+
+def get_generations(names):
+    """Текущие поколения кэшей names за одно чтение кэша."""
+    keys = {GENERATION_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    return {name: found[key] if key in found else get_generation(name)
+            for key, name in keys.items()}
+
+
+def bump_generation(*names):
+    """Делает устаревшими все страницы, закэшированные в поколениях names."""
+    now = time.time_ns()
+    cache.set_many(
+        {GENERATION_KEY.format(name): now for name in names}, timeout=None)
+
+
+def _early_refresh(entry):
+    """Вероятностное досрочное обновление (XFetch): чем ближе срок
+    и дольше строилась страница, тем вероятнее пересборка."""
+    return time.time() - entry['delta'] * EARLY_REFRESH_BETA * math.log(
+        1 - random.random()) >= entry['expires']
+
+
+def _lock_path(key):
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return os.path.join(settings.CACHE_DIR, LOCK_DIR, digest)
+
+
+def _lock_expired(path):
+    try:
+        return time.time() - os.stat(path).st_mtime > LOCK_TIMEOUT
+    except FileNotFoundError:
+        return True
+
+
+def _acquire(key):
+    """Блокировка пересборки страницы key: файл в CACHE_DIR, созданный
+    с O_CREAT | O_EXCL, поэтому ее берет ровно один процесс машины.
+
+    Возвращает путь файла или None, если блокировка занята. Блокировку
+    старше LOCK_TIMEOUT, оставленную упавшим процессом, можно снять;
+    это снятие не атомарно, и тогда страницу изредка соберут двое.
+    """
+    path = _lock_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            if not _lock_expired(path):
+                return None
+            with suppress(FileNotFoundError):
+                os.unlink(path)
+    return None
+
+
+def _release(path):
+    with suppress(FileNotFoundError):
+        os.unlink(path)
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _cacheable(request, response):
+    if request.method != 'GET' or response.streaming:
+        return False
+    if response.status_code != 200:
+        return False
+    # Ответ, ставящий cookie на запрос без cookie, может быть личным.
+    if (not request.COOKIES and response.cookies
+            and has_vary_header(response, 'Cookie')):
+        return False
+    return 'private' not in response.get('Cache-Control', ())
+
+
+def _rebuild(view, request, args, kwargs, name, generation, timeout):
+    started = time.monotonic()
+    # Страница попадет в кэш поколения для всех клиентов, поэтому
+    # собирается из default, а не из, возможно, отстающей реплики.
+    with routers.primary():
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+    if not _cacheable(request, response):
+        return response
+    # Браузер проверяет страницу при каждом показе: timeout — срок копии
+    # на сервере, а свежесть ей обеспечивает смена поколения.
+    patch_response_headers(response, 0)
+    # Список заголовков Vary и страница живут дольше timeout, чтобы
+    # устаревшую копию можно было отдать во время пересборки.
+    key = learn_cache_key(
+        request, response, timeout + STALE_TIME, name, cache=cache)
+    cache.set(key, {
+        'response': response,
+        'generation': generation,
+        'expires': time.time() + timeout,
+        'delta': time.monotonic() - started,
+    }, timeout + STALE_TIME)
+    return response
+
+
+def cache_page_generation(timeout, key_prefix, versioned=True):
+    """Как cache_page, но страница устаревает и со сменой поколения
+    key_prefix.
+
+    key_prefix может быть функцией от аргументов view, возвращающей
+    имя поколения; если она вернула None, страница не кэшируется.
+    С versioned=False имя само описывает состояние страницы и меняется
+    вместе с ним: поколение для него не заводится, а старые страницы
+    просто истекают.
+
+    Устаревшую страницу пересобирает один запрос, остальные на это время
+    получают старую копию; незадолго до срока страница с некоторой
+    вероятностью пересобирается заранее. Блокировка пересборки — файл
+    в CACHE_DIR, поэтому она общая для процессов одной машины. Ключ
+    учитывает заголовки Vary ответа, как у cache_page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            name = key_prefix
+            if callable(key_prefix):
+                name = key_prefix(request, *args, **kwargs)
+            if name is None or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generation = get_generation(name) if versioned else None
+            key = get_cache_key(request, name, 'GET', cache=cache)
+            entry = cache.get(key) if key else None
+            fresh = (entry is not None
+                     and entry['generation'] == generation
+                     and not _early_refresh(entry))
+            lock = None if fresh or not key else _acquire(key)
+            if fresh:
+                result = 'hit'
+            elif lock:
+                result = 'miss' if entry is None else 'refresh'
+            elif entry is not None:
+                result = 'stale'
+            else:
+                # Копии нет совсем: пока страницу собирает другой запрос,
+                # ждем его результата, а не собираем ее параллельно.
+                entry = _wait_for(key) if key else None
+                result = 'miss' if entry is None else 'wait'
+            metrics.inc('yatube_cache_requests_total', {
+                'cache': name.partition(':')[0], 'result': result})
+            if result in ('hit', 'stale', 'wait'):
+                return entry['response']
+            try:
+                return _rebuild(view, request, args, kwargs,
+                                name, generation, timeout)
+            finally:
+                if lock:
+                    _release(lock)
+        return wrapper
+    return decorator
+
+
+def invalidate(*names):
+    """Сбрасывает поколения сразу и повторно после коммита транзакции.
+
+    Повторный сброс не дает закэшировать страницу, отрисованную
+    конкурентным запросом между первым сбросом и коммитом.
+    """
+    bump_generation(*names)
+    transaction.on_commit(lambda: bump_generation(*names))
@@ -0,0 +1,101 @@
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _shift(queryset, delta, *fields):
+    """Атомарно сдвигает счетчики на delta, не уходя ниже нуля."""
+    return queryset.update(**{
+        field: Greatest(F(field) + delta, 0) for field in fields
+    })
+
+
+def shift_user(user_id, delta, *fields):
+    updated = _shift(UserStats.objects.filter(user_id=user_id), delta, *fields)
+    if not updated and delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        _shift(UserStats.objects.filter(user_id=user_id), delta, *fields)
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), delta, 'posts_count')
+
+
+def shift_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), delta, 'comments_count')
+
+
+def _batches(queryset, batch_size):
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        page = ids.filter(pk__gt=last) if last is not None else ids
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def _counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by()
+        .values_list(field).annotate(total=Count('pk'))
+    )
+
+
+def recount_users(batch_size):
+    """Пересчитывает счетчики пользователей, возвращает число исправлений."""
+    fixed = 0
+    for ids in _batches(User.objects.all(), batch_size):
+        posts = _counts(Post.objects, 'author', ids)
+        followers = _counts(Follow.objects, 'author', ids)
+        following = _counts(Follow.objects, 'user', ids)
+        existing = UserStats.objects.in_bulk(ids)
+        UserStats.objects.bulk_create(
+            UserStats(user_id=user_id) for user_id in ids
+            if user_id not in existing
+        )
+        changed = []
+        for user_id in ids:
+            stats = existing.get(user_id) or UserStats(user_id=user_id)
+            actual = (posts.get(user_id, 0),
+                      followers.get(user_id, 0),
+                      following.get(user_id, 0))
+            if actual != (stats.posts_count,
+                          stats.followers_count,
+                          stats.following_count):
+                (stats.posts_count,
+                 stats.followers_count,
+                 stats.following_count) = actual
+                changed.append(stats)
+        UserStats.objects.bulk_update(
+            changed,
+            ('posts_count', 'followers_count', 'following_count'))
+        fixed += len(changed)
+    return fixed
+
+
+def _recount(model, related, field, counter, batch_size):
+    fixed = 0
+    for ids in _batches(model.objects.all(), batch_size):
+        actual = _counts(related.objects, field, ids)
+        changed = []
+        for obj in model.objects.filter(pk__in=ids).only('pk', counter):
+            value = actual.get(obj.pk, 0)
+            if getattr(obj, counter) != value:
+                setattr(obj, counter, value)
+                changed.append(obj)
+        model.objects.bulk_update(changed, (counter,))
+        fixed += len(changed)
+    return fixed
+
+
+def recount_groups(batch_size):
+    return _recount(Group, Post, 'group', 'posts_count', batch_size)
+
+
+def recount_posts(batch_size):
+    return _recount(Post, Comment, 'post', 'comments_count', batch_size)
@@ -0,0 +1,83 @@
+"""Выгрузка постов с комментариями в форматах import_posts.
+
+Посты и комментарии читаются двумя курсорами через
+QuerySet.iterator(chunk_size=...) и сливаются по id поста, поэтому память
+не зависит от размера выгрузки.
+"""
+import csv
+import json
+
+from .models import Comment
+
+CHUNK_SIZE = 2000
+# Сколько символов копить перед отправкой клиенту.
+BUFFER_SIZE = 64 * 1024
+
+CSV_FIELDS = ('type', 'author', 'group', 'text', 'date')
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def records(posts):
+    """Записи постов queryset posts по возрастанию id вместе
+    с комментариями."""
+    post_rows = posts.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    comment_rows = Comment.objects.filter(
+        post__in=posts.values('pk')).order_by(
+        'post_id', 'created', 'pk').values_list(
+        'post_id', 'author__username', 'text', 'created'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    comment = next(comment_rows, None)
+    for pk, author, group, text, pub_date in post_rows:
+        comments = []
+        while comment is not None and comment[0] <= pk:
+            if comment[0] == pk:
+                comments.append({'author': comment[1], 'text': comment[2],
+                                 'created': comment[3].isoformat()})
+            comment = next(comment_rows, None)
+        yield {'id': pk, 'author': author, 'group': group, 'text': text,
+               'pub_date': pub_date.isoformat(), 'comments': comments}
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for record in records:
+        yield writer.writerow(('post', record['author'],
+                               record['group'] or '', record['text'],
+                               record['pub_date']))
+        for comment in record['comments']:
+            yield writer.writerow(('comment', comment['author'], '',
+                                   comment['text'], comment['created']))
+
+
+LINES = {'jsonl': jsonl_lines, 'csv': csv_lines}
+
+
+def stream(posts, file_format):
+    """Куски текста выгрузки размером около BUFFER_SIZE."""
+    buffer, size = [], 0
+    for line in LINES[file_format](records(posts)):
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sites.shortcuts import get_current_site
+from django.contrib.syndication.views import Feed, add_domain
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from core.decorators import query_budget, read_replica
+
+from .cache import (AUTHOR_FEED, GROUP_FEED, cache_page_generation,
+                    generation_time, get_generation)
+from .models import Group
+
+User = get_user_model()
+
+
+class FeedState:
+    """Поколение ленты за один запрос к БД; ETag и Last-Modified ленты
+    берутся из поколения, как у JSON-лент."""
+
+    def __init__(self, model, generation, **lookup):
+        self.model = model
+        self.generation = generation
+        self.lookup = lookup
+
+    def generation_name(self, request, **kwargs):
+        """Имя поколения ленты или None, если объекта нет."""
+        cache_attr = f'_feed_state_{self.model._meta.model_name}'
+        if not hasattr(request, cache_attr):
+            lookup = {field: kwargs[arg]
+                      for field, arg in self.lookup.items()}
+            pk = self.model.objects.filter(**lookup).values_list(
+                'pk', flat=True).first()
+            setattr(request, cache_attr,
+                    pk and self.generation.format(pk))
+        return getattr(request, cache_attr)
+
+    def etag(self, request, **kwargs):
+        name = self.generation_name(request, **kwargs)
+        return name and f'{name}:{get_generation(name)}'
+
+    def last_modified(self, request, **kwargs):
+        # Время смены поколения, в отличие от Max(modified) постов,
+        # не уменьшается при удалении или переносе нового поста.
+        name = self.generation_name(request, **kwargs)
+        return name and generation_time(name)
+
+    def __call__(self, view):
+        """Кэширует ленту по поколению и отвечает 304 без ее построения."""
+        cached_view = cache_page_generation(
+            settings.CACHE_TIME, key_prefix=self.generation_name)(view)
+        return read_replica(query_budget(4)(condition(
+            etag_func=self.etag,
+            last_modified_func=self.last_modified)(cached_view)))
+
+
+group_feed_state = FeedState(Group, GROUP_FEED, slug='slug')
+author_feed_state = FeedState(User, AUTHOR_FEED, username='username')
+
+
+class PostsFeed(Feed):
+    def __call__(self, request, *args, **kwargs):
+        response = super().__call__(request, *args, **kwargs)
+        # Feed ставит Last-Modified по дате последней записи; FeedState
+        # заменяет его временем смены поколения.
+        del response['Last-Modified']
+        return response
+
+    def get_feed(self, obj, request):
+        # Feed дополняет доменом только ссылки на ленту и записи.
+        feed = super().get_feed(obj, request)
+        domain = get_current_site(request).domain
+        for item in feed.items:
+            if item['author_link']:
+                item['author_link'] = add_domain(
+                    domain, item['author_link'], request.is_secure())
+        return feed
+
+    def item_title(self, item):
+        return str(item)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', kwargs={'post_id': item.pk})
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.modified
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_author_link(self, item):
+        return reverse('posts:profile', args=(item.author.username,))
+
+
+class GroupPostsFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return obj.title
+
+    def description(self, obj):
+        return obj.description
+
+    subtitle = description
+
+    def link(self, obj):
+        return reverse('posts:group_posts', kwargs={'slug': obj.slug})
+
+    def items(self, obj):
+        return obj.posts.select_related('author')[
+            :settings.NUMBER_OF_FEED_POSTS]
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+
+class AuthorPostsFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Записи {obj.get_full_name() or obj.username}'
+
+    description = title
+    subtitle = title
+
+    def link(self, obj):
+        return reverse('posts:profile', args=(obj.username,))
+
+    def items(self, obj):
+        return obj.posts.select_related('author')[
+            :settings.NUMBER_OF_FEED_POSTS]
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
@@ -23,3 +23,16 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class ReplyForm(forms.Form):
+    """Комментарий, на который отвечают формой CommentForm."""
+    parent = forms.ModelChoiceField(
+        queryset=Comment.objects.none(), required=False,
+        widget=forms.HiddenInput)
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if post is not None:
+            # Ответить можно только на комментарий того же поста.
+            self.fields['parent'].queryset = post.comments.all()
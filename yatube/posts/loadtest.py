@@ -0,0 +1,321 @@
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib import import_module
+from io import BytesIO
+from itertools import accumulate
+from random import Random
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth import SESSION_KEY
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection, connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.urls import reverse
+
+from .benchmarks import percentile
+from .models import Group, Post, UserStats
+
+DEFAULT_MIX = {'index': 50, 'group': 20, 'follow': 20, 'comment': 10}
+LOCKED = 'database is locked'
+# В режиме shared cache SQLite сообщает о блокировке иначе.
+LOCK_MESSAGES = (LOCKED, 'database table is locked')
+
+
+class LoadTestError(Exception):
+    pass
+
+
+def parse_mix(value):
+    """'index=50,comment=10' → {'index': 50, 'comment': 10}.
+
+    Тип аргумента --mix: ошибка показывается как ошибка использования
+    команды.
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'Неизвестный сценарий {name}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f'Неверный вес сценария {name}: {weight}')
+    return mix
+
+
+class WsgiTransport:
+    """Вызывает yatube.wsgi.application в том же процессе."""
+    _errors = threading.local()
+
+    def __init__(self):
+        from yatube.wsgi import application
+        self.application = application
+        got_request_exception.connect(self._remember_error)
+
+    def close(self):
+        got_request_exception.disconnect(self._remember_error)
+
+    @classmethod
+    def _remember_error(cls, sender, **kwargs):
+        cls._errors.last = sys.exc_info()[1]
+
+    def __call__(self, method, path, body, cookies):
+        self._errors.last = None
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_COOKIE': cookies,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        }
+        setup_testing_defaults(environ)
+        statuses = []
+        result = self.application(
+            environ, lambda status, headers, exc_info=None:
+            statuses.append(status))
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        error = self._errors.last
+        if error is not None:
+            content = f'{type(error).__name__}: {error}'.encode()
+        return int(statuses[0].split()[0]), content
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Ходит по HTTP на уже запущенный сервер."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def close(self):
+        pass
+
+    def __call__(self, method, path, body, cookies):
+        request = urllib.request.Request(
+            self.base_url + path, data=body if method == 'POST' else None,
+            method=method,
+            headers={'Cookie': cookies, 'Content-Type':
+                     'application/x-www-form-urlencoded'})
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+def login_cookies(user):
+    """Cookie сессии и CSRF-токен пользователя без проверки пароля."""
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.create()
+    request = HttpRequest()
+    token = get_token(request)
+    cookies = (f'{settings.SESSION_COOKIE_NAME}={store.session_key}; '
+               f'{settings.CSRF_COOKIE_NAME}={request.META["CSRF_COOKIE"]}')
+    return cookies, token
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def record(self, scenario, elapsed, error):
+        with self.lock:
+            self.latencies[scenario].append(elapsed)
+            if error:
+                self.errors[scenario][error] += 1
+
+    def dump(self):
+        return dict(self.latencies), {
+            scenario: dict(errors)
+            for scenario, errors in self.errors.items()}
+
+    def merge(self, latencies, errors):
+        with self.lock:
+            for scenario, values in latencies.items():
+                self.latencies[scenario].extend(values)
+            for scenario, counts in errors.items():
+                self.errors[scenario].update(counts)
+
+
+def classify(status, content):
+    """Вид ошибки ответа или None для успешного."""
+    if status >= 500 and any(
+            message.encode() in content for message in LOCK_MESSAGES):
+        return LOCKED
+    if status >= 400:
+        return f'HTTP {status}'
+    return None
+
+
+class LoadTest:
+    """Смешанная нагрузка из threads потоков в каждом из processes
+    процессов в течение duration секунд.
+
+    rate — целевое число запросов в секунду на все потоки, 0 — без пауз.
+    Процессы запускаются через fork и обходят GIL, поэтому конкуренция
+    за базу получается настоящей.
+    """
+
+    def __init__(self, transport, mix=None, threads=8, duration=10.0,
+                 rate=0.0, users=20, seed=0, processes=1):
+        self.transport = transport
+        self.mix = mix or DEFAULT_MIX
+        self.processes = processes
+        self.threads = threads
+        self.duration = duration
+        self.rate = rate
+        self.seed = seed
+        self.names = list(self.mix)
+        self.weights = list(accumulate(self.mix.values()))
+        self.prepare(users)
+
+    def prepare(self, users):
+        readers = [stats.user for stats in UserStats.objects.select_related(
+            'user').order_by('-following_count')[:users]]
+        self.groups = list(Group.objects.order_by(
+            '-posts_count').values_list('slug', flat=True)[:20])
+        self.posts = list(Post.objects.values_list('pk', flat=True)[:100])
+        if not (readers and self.groups and self.posts):
+            raise LoadTestError(
+                'База пуста: сначала выполните manage.py seed_bench.')
+        self.sessions = [login_cookies(user) for user in readers]
+
+    def request(self, scenario, rng):
+        """(метод, адрес, тело, cookie) очередного запроса сценария."""
+        if scenario == 'index':
+            page = rng.randint(1, 5)
+            return 'GET', f'{reverse("posts:index")}?page={page}', b'', ''
+        if scenario == 'group':
+            slug = rng.choice(self.groups)
+            return 'GET', reverse(
+                'posts:group_posts', kwargs={'slug': slug}), b'', ''
+        cookies, token = rng.choice(self.sessions)
+        if scenario == 'follow':
+            return 'GET', reverse('posts:follow_index'), b'', cookies
+        body = urlencode({'text': 'Комментарий под нагрузкой',
+                          'csrfmiddlewaretoken': token}).encode()
+        return 'POST', reverse('posts:add_comment', kwargs={
+            'post_id': rng.choice(self.posts)}), body, cookies
+
+    def worker(self, number, stats, deadline):
+        rng = Random(self.seed * 1000 + number)
+        interval = (self.threads * self.processes / self.rate
+                    if self.rate else 0)
+        next_at = time.monotonic() + rng.random() * interval
+        try:
+            while True:
+                if interval:
+                    time.sleep(max(0, next_at - time.monotonic()))
+                    next_at += interval
+                if time.monotonic() >= deadline:
+                    return
+                scenario = rng.choices(self.names,
+                                       cum_weights=self.weights)[0]
+                started = time.perf_counter()
+                try:
+                    error = classify(*self.transport(
+                        *self.request(scenario, rng)))
+                except OperationalError as exc:
+                    error = (LOCKED if any(message in str(exc)
+                                           for message in LOCK_MESSAGES)
+                             else repr(exc))
+                except Exception as exc:
+                    error = type(exc).__name__
+                stats.record(scenario, time.perf_counter() - started, error)
+        finally:
+            connection.close()
+
+    def run(self):
+        stats = Stats()
+        started = time.monotonic()
+        deadline = started + self.duration
+        if self.processes > 1:
+            self.run_processes(stats, deadline)
+        else:
+            self.run_threads(stats, deadline)
+        self.transport.close()
+        return report(stats, time.monotonic() - started)
+
+    def run_threads(self, stats, deadline, first=0):
+        with ThreadPoolExecutor(self.threads) as pool:
+            for future in [pool.submit(self.worker, first + number,
+                                       stats, deadline)
+                           for number in range(self.threads)]:
+                future.result()
+
+    def run_processes(self, stats, deadline):
+        global _forked
+        _forked = self, deadline
+        # Дочерние процессы не должны делить соединения родителя.
+        connections.close_all()
+        with ProcessPoolExecutor(
+                self.processes,
+                mp_context=multiprocessing.get_context('fork')) as pool:
+            for result in pool.map(_run_forked, range(self.processes)):
+                stats.merge(*result)
+
+
+_forked = None
+
+
+def _run_forked(number):
+    load_test, deadline = _forked
+    stats = Stats()
+    load_test.run_threads(stats, deadline, first=number * load_test.threads)
+    return stats.dump()
+
+
+def report(stats, elapsed):
+    def summary(latencies, errors):
+        milliseconds = [latency * 1000 for latency in latencies]
+        return {
+            'requests': len(latencies),
+            'throughput': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(milliseconds, 50), 3),
+            'p95_ms': round(percentile(milliseconds, 95), 3),
+            'p99_ms': round(percentile(milliseconds, 99), 3),
+            'error_rate': round(sum(errors.values()) / len(latencies), 4),
+            'errors': dict(errors),
+        }
+
+    scenarios = {
+        name: summary(latencies, stats.errors[name])
+        for name, latencies in stats.latencies.items()
+    }
+    everything = [latency for latencies in stats.latencies.values()
+                  for latency in latencies]
+    total_errors = sum(stats.errors.values(), Counter())
+    return {
+        'elapsed': round(elapsed, 3),
+        'total': summary(everything, total_errors) if everything else {},
+        'scenarios': scenarios,
+    }
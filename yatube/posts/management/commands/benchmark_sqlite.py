@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+
+from posts import loadtest
+
+# Настройки SQLite по умолчанию: журнал отката и полная синхронизация.
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает конкурентные чтение и запись на засеянной базе '
+            'с PRAGMA SQLite по умолчанию и с SQLITE_PRAGMAS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=2,
+            help='Потоков в каждом процессе.')
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10.0)
+        parser.add_argument(
+            '--mix', type=loadtest.parse_mix,
+            default={'group': 40, 'follow': 40, 'comment': 20},
+            help='Веса сценариев, как у loadtest.')
+
+    def handle(self, *args, threads, processes, duration, mix,
+               **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('База не SQLite')
+        results = {}
+        for name, pragmas in (('default', DEFAULT_PRAGMAS),
+                              ('tuned', settings.SQLITE_PRAGMAS)):
+            # Новые PRAGMA применяются к новым соединениям.
+            connections.close_all()
+            with override_settings(SQLITE_PRAGMAS=pragmas, DEBUG=False):
+                try:
+                    results[name] = loadtest.LoadTest(
+                        loadtest.WsgiTransport(), mix, threads,
+                        duration, processes=processes).run()
+                except loadtest.LoadTestError as error:
+                    raise CommandError(error)
+        connections.close_all()
+        for name, result in results.items():
+            self.stdout.write(f'{name}: {pragmas_text(name)}')
+            for scenario, row in sorted(result['scenarios'].items()):
+                self.stdout.write(
+                    f'  {scenario:<8} {row["throughput"]:>8.1f}/с  '
+                    f'p95 {row["p95_ms"]:>8.2f} '
+                    f'p99 {row["p99_ms"]:>8.2f} мс  '
+                    f'блокировок {row["errors"].get(loadtest.LOCKED, 0)}  '
+                    f'ошибок {row["error_rate"]:.2%}')
+        default, tuned = (results[name]['total']['throughput']
+                          for name in ('default', 'tuned'))
+        self.stdout.write(
+            f'Пропускная способность: {default}/с → {tuned}/с '
+            f'(x{tuned / default:.2f})' if default else '')
+
+
+def pragmas_text(name):
+    pragmas = (DEFAULT_PRAGMAS if name == 'default'
+               else settings.SQLITE_PRAGMAS)
+    return ', '.join(f'{key}={value}' for key, value in pragmas.items())
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число SQL-запросов и размер ответа страниц '
+            'posts на засеянной базе и сравнивает с сохраненным baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help='Какие сценарии запускать; по умолчанию все.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--use-cache', action='store_true',
+            help='Не очищать кэши перед каждым запросом.')
+        parser.add_argument(
+            '--baseline', default=str(benchmarks.BASELINE_PATH),
+            help='JSON-файл с baseline.')
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Записать результаты в baseline вместо сравнения.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95 и размера ответа, доля.')
+
+    def handle(self, *args, views, iterations, warmup, use_cache,
+               baseline, save, threshold, **options):
+        try:
+            results = benchmarks.run(views, iterations, warmup, use_cache)
+        except benchmarks.BenchmarkError as error:
+            raise CommandError(error)
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<13} p50 {result["p50_ms"]:>8.2f} '
+                f'p95 {result["p95_ms"]:>8.2f} '
+                f'p99 {result["p99_ms"]:>8.2f} мс  '
+                f'запросов {result["queries"]:>3}  '
+                f'{result["bytes"]:>7} байт')
+        previous = benchmarks.load_baseline(baseline)
+        if save:
+            previous.update(results)
+            benchmarks.save_baseline(previous, baseline)
+            self.stdout.write(f'Baseline записан в {baseline}')
+            return
+        regressions = benchmarks.compare(results, previous, threshold)
+        if regressions:
+            raise CommandError(
+                'Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,38 @@
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты с комментариями в JSONL или CSV '
+            'в формате import_posts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--author',
+            help='Имя автора; по умолчанию выгружаются все посты.')
+        parser.add_argument(
+            '--format', choices=export.CONTENT_TYPES, default='jsonl')
+        parser.add_argument(
+            '--output', help='Файл выгрузки, по умолчанию stdout.')
+
+    def handle(self, *args, author, output, **options):
+        posts = Post.objects.all()
+        if author is not None:
+            try:
+                posts = User.objects.get(username=author).posts.all()
+            except User.DoesNotExist:
+                raise CommandError(f'Автор {author} не найден.')
+        chunks = export.stream(posts, options['format'])
+        if output is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as file:
+            for chunk in chunks:
+                file.write(chunk)
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from PIL import Image
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', action='store_true',
+            help='Не завершаться, а проверять новые посты каждые --interval '
+                 'секунд.')
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Пауза между проверками в режиме --watch.')
+
+    def handle(self, *args, watch, interval, **options):
+        failed = set()
+        while True:
+            post_ids = thumbnails.pending().exclude(
+                pk__in=failed).values_list('pk', flat=True)
+            done = 0
+            for post_id in list(post_ids):
+                try:
+                    generated = thumbnails.generate(post_id)
+                except (OSError, Image.DecompressionBombError) as error:
+                    # Битая или пропавшая картинка одного поста не должна
+                    # останавливать обработчик в режиме --watch.
+                    self.stderr.write(
+                        f'Пост {post_id}: не удалось построить миниатюру: '
+                        f'{error}')
+                    generated = False
+                if generated:
+                    done += 1
+                else:
+                    failed.add(post_id)
+            if done or not watch:
+                self.stdout.write(f'Построено миниатюр: {done}')
+            if not watch:
+                return
+            close_old_connections()
+            time.sleep(interval)
@@ -0,0 +1,297 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, search, threads, timeline
+from posts.cache import invalidate, post_generations
+from posts.export import CSV_FIELDS
+from posts.models import Comment, Group, Post
+from posts.utils import explicit_dates
+
+User = get_user_model()
+
+
+class InvalidRecord(Exception):
+    pass
+
+
+def read_jsonl(file):
+    """Записи JSONL: пост с необязательным списком comments на строке.
+
+    Вместе с записью отдается смещение в байтах, с которого начинается
+    следующая.
+    """
+    for line in iter(file.readline, b''):
+        if line.strip():
+            yield line, file.tell()
+
+
+class Lines:
+    """Строки бинарного файла для csv.reader и смещение после последней."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = file.tell()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.offset = self.file.tell()
+        return line.decode('utf-8')
+
+
+def read_csv(file):
+    """Записи CSV: строка post и следующие за ней строки comment.
+
+    Как и read_jsonl, отдает запись со смещением следующей.
+    """
+    record = None
+    lines = Lines(file)
+    end = lines.offset
+    reader = csv.DictReader(lines, fieldnames=CSV_FIELDS)
+    for row in reader:
+        if row['type'] == 'post':
+            if record is not None:
+                yield record, end
+            record = dict(row, comments=[])
+        elif row['type'] == 'comment' and record is not None:
+            record['comments'].append(row)
+        elif row['type'] != 'type':
+            raise CommandError(
+                f'Строка {reader.line_num}: ожидался пост или комментарий '
+                'к посту.')
+        end = lines.offset
+    if record is not None:
+        yield record, end
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+def assign_ids(model, objs):
+    """Проставляет id объектам, созданным bulk_create.
+
+    SQLite не возвращает id из bulk_create, но внутри транзакции новые
+    строки — последние по id.
+    """
+    if objs and objs[0].pk is None:
+        ids = model.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:len(objs)]
+        for obj, pk in zip(objs, reversed(list(ids))):
+            obj.pk = pk
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает посты с комментариями из JSONL или CSV '
+            'пачками bulk_create; после сбоя продолжает с контрольной '
+            'точки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='По умолчанию — по расширению файла.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов загружать в одной транзакции.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию {path}.checkpoint.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала файла, не читая контрольную точку.')
+
+    def handle(self, *args, path, batch_size, restart, **options):
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format}: укажите --format.')
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.state = {'records': 0, 'offset': 0, 'posts': 0, 'comments': 0,
+                      'skipped': 0, 'done': False}
+        if not restart:
+            self.load_checkpoint()
+        if self.state['done']:
+            return
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        with open(path, 'rb') as file:
+            file.seek(self.state['offset'])
+            self.import_records(READERS[file_format](file), batch_size,
+                                parse=file_format == 'jsonl')
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        pending = state.pop('pending', None)
+        if pending and not Post.objects.filter(
+                pk=pending['pk'], author_id=pending['author_id'],
+                pub_date=parse_datetime(pending['pub_date'])).exists():
+            # Транзакция последней пачки не дошла до коммита.
+            state = pending['previous']
+        self.state.update(state)
+        if self.state['done']:
+            self.stdout.write('Файл уже загружен')
+            return
+        self.stdout.write(
+            f'Продолжение с контрольной точки: {self.state["records"]} '
+            'записей уже загружено')
+
+    def save_checkpoint(self, state):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(state, file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def import_records(self, records, batch_size, parse):
+        started = time.monotonic()
+        imported = 0
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            posts, comments = [], []
+            for number, (record, _) in enumerate(
+                    batch, start=self.state['records'] + 1):
+                try:
+                    post, post_comments = self.build(
+                        json.loads(record) if parse else record)
+                except (InvalidRecord, ValueError, TypeError,
+                        AttributeError) as error:
+                    self.state['skipped'] += 1
+                    self.stderr.write(f'Запись {number} пропущена: {error}')
+                    continue
+                posts.append(post)
+                comments.append(post_comments)
+            self.write_batch(batch, posts, comments)
+            imported += len(posts) + sum(map(len, comments))
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{self.state["records"]} записей: постов '
+                f'{self.state["posts"]}, комментариев '
+                f'{self.state["comments"]}, пропущено '
+                f'{self.state["skipped"]}; '
+                f'{imported / elapsed if elapsed else 0:.0f} строк/с')
+        self.state['done'] = True
+        self.save_checkpoint(self.state)
+
+    def write_batch(self, batch, posts, comments):
+        previous = dict(self.state)
+        for post, post_comments in zip(posts, comments):
+            post.comments_count = len(post_comments)
+        with explicit_dates(Post._meta.get_field('pub_date'),
+                            Post._meta.get_field('modified'),
+                            Comment._meta.get_field('created')), \
+                transaction.atomic():
+            Post.objects.bulk_create(posts)
+            assign_ids(Post, posts)
+            for post, post_comments in zip(posts, comments):
+                for comment in post_comments:
+                    comment.post_id = post.pk
+            comments = [comment for post_comments in comments
+                        for comment in post_comments]
+            Comment.objects.bulk_create(comments)
+            assign_ids(Comment, comments)
+            self.update_derived(posts, comments)
+            self.state['records'] += len(batch)
+            self.state['offset'] = batch[-1][1]
+            self.state['posts'] += len(posts)
+            self.state['comments'] += len(comments)
+            state = dict(self.state)
+            if posts:
+                # Коммит может не состояться после записи точки: по
+                # последнему посту пачки проверим это при продолжении.
+                last = posts[-1]
+                state['pending'] = {
+                    'pk': last.pk, 'author_id': last.author_id,
+                    'pub_date': last.pub_date.isoformat(),
+                    'previous': previous}
+            self.save_checkpoint(state)
+        self.save_checkpoint(self.state)
+
+    def update_derived(self, posts, comments):
+        """Ленты, счетчики, пути комментариев и поиск для одной пачки.
+
+        bulk_create обходит сигналы, поэтому пачка обновляет их сама в
+        своей транзакции: остальная база не пересчитывается, а сбрасываются
+        только поколения лент ее авторов и групп.
+        """
+        if comments:
+            threads.fill_root_paths(
+                Comment.objects.filter(pk__gte=comments[0].pk))
+        timeline.fan_out_posts(posts)
+        for author_id, total in Counter(
+                post.author_id for post in posts).items():
+            counters.shift_user(author_id, total, 'posts_count')
+        for group_id, total in Counter(
+                post.group_id for post in posts).items():
+            counters.shift_group(group_id, total)
+        if search.is_available():
+            search.index_new(posts, comments)
+        generations = set()
+        for post in posts:
+            generations |= post_generations(post)
+        if generations:
+            invalidate(*generations)
+
+    def build(self, record):
+        """Пост и его комментарии из записи файла."""
+        post = Post(text=self.text(record),
+                    author_id=self.author(record),
+                    group_id=self.group(record))
+        post.pub_date = post.modified = self.date(record, 'pub_date')
+        comments = []
+        for item in record.get('comments') or ():
+            comment = Comment(text=self.text(item),
+                              author_id=self.author(item))
+            comment.created = self.date(item, 'created')
+            comments.append(comment)
+        return post, comments
+
+    def text(self, record):
+        text = (record.get('text') or '').strip()
+        if not text:
+            raise InvalidRecord('пустой текст')
+        return text
+
+    def author(self, record):
+        username = record.get('author')
+        if username not in self.authors:
+            raise InvalidRecord(f'неизвестный автор {username}')
+        return self.authors[username]
+
+    def group(self, record):
+        slug = record.get('group')
+        if not slug:
+            return None
+        if slug not in self.groups:
+            raise InvalidRecord(f'неизвестная группа {slug}')
+        return self.groups[slug]
+
+    def date(self, record, field):
+        value = record.get(field) or record.get('date')
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise InvalidRecord(f'неверная дата {value}')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
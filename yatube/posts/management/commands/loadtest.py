@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from posts import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Нагружает приложение смешанным трафиком из пула потоков и '
+            'выводит пропускную способность, перцентили задержки и ошибки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000; '
+                 'по умолчанию yatube.wsgi.application вызывается в '
+                 'процессе.')
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Потоков в каждом процессе.')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Процессов нагрузки, запускаются через fork.')
+        parser.add_argument(
+            '--duration', type=float, default=10.0,
+            help='Длительность в секундах.')
+        parser.add_argument(
+            '--rate', type=float, default=0.0,
+            help='Целевое число запросов в секунду; 0 — без ограничения.')
+        parser.add_argument(
+            '--mix', type=loadtest.parse_mix,
+            default=loadtest.DEFAULT_MIX,
+            help='Веса сценариев index, group, follow, comment, например '
+                 'index=50,group=20,follow=20,comment=10.')
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Сколько пользователей с подписками вошли на сайт.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--json', action='store_true', dest='as_json',
+            help='Вывести результат в JSON.')
+
+    def handle(self, *args, url, threads, processes, duration, rate, mix,
+               users, seed, as_json, **options):
+        try:
+            # Как в бою: без отладочной панели и журнала запросов.
+            with override_settings(DEBUG=False):
+                transport = (loadtest.HttpTransport(url) if url
+                             else loadtest.WsgiTransport())
+                result = loadtest.LoadTest(
+                    transport, mix, threads, duration, rate, users,
+                    seed, processes).run()
+        except loadtest.LoadTestError as error:
+            raise CommandError(error)
+        if as_json:
+            self.stdout.write(
+                json.dumps(result, indent=2, ensure_ascii=False))
+            return
+        self.stdout.write(f'Длительность {result["elapsed"]} с')
+        rows = [('всего', result['total'])] + sorted(
+            result['scenarios'].items())
+        for name, row in rows:
+            if not row:
+                continue
+            self.stdout.write(
+                f'{name:<8} {row["requests"]:>6} запросов '
+                f'{row["throughput"]:>8.1f}/с  '
+                f'p50 {row["p50_ms"]:>8.2f} p95 {row["p95_ms"]:>8.2f} '
+                f'p99 {row["p99_ms"]:>8.2f} мс  '
+                f'ошибок {row["error_rate"]:.2%}')
+            for error, count in sorted(row['errors'].items()):
+                self.stdout.write(f'    {error}: {count}')
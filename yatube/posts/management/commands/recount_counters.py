@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счетчики постов, '
+            'комментариев и подписок пачками и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк обрабатывать за один запрос.')
+
+    def handle(self, *args, batch_size, **options):
+        for name, recount in (('users', counters.recount_users),
+                              ('groups', counters.recount_groups),
+                              ('posts', counters.recount_posts)):
+            fixed = recount(batch_size)
+            self.stdout.write(f'{name}: исправлено {fixed}')
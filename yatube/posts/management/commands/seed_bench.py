@@ -0,0 +1,236 @@
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+from random import Random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts import counters, search, threads, timeline
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import explicit_dates
+
+User = get_user_model()
+
+BENCH_PASSWORD = 'bench-password'
+
+WORDS = (
+    'кот', 'собака', 'город', 'утро', 'вечер', 'дорога', 'книга', 'море',
+    'лес', 'работа', 'друзья', 'поезд', 'музыка', 'фильм', 'погода', 'снег',
+    'дождь', 'солнце', 'парк', 'кофе', 'чай', 'письмо', 'отпуск', 'дача',
+    'проект', 'код', 'идея', 'встреча', 'праздник', 'история', 'фото',
+    'рецепт', 'ужин', 'завтрак', 'прогулка', 'река', 'мост', 'улица',
+    'новости', 'выставка', 'театр', 'концерт', 'спорт', 'бег', 'велосипед',
+    'сегодня', 'вчера', 'завтра', 'очень', 'снова', 'наконец', 'долго',
+    'красивый', 'новый', 'старый', 'тихий', 'шумный', 'теплый', 'холодный',
+)
+IMAGE_COLORS = (
+    (200, 60, 60), (60, 160, 90), (50, 90, 200), (230, 200, 60),
+    (120, 60, 170), (40, 170, 190), (240, 130, 40), (90, 90, 90),
+)
+IMAGE_SIZE = (1200, 800)
+
+
+def zipf_weights(count, skew):
+    """Накопленные веса рангов: первые элементы — «знаменитости»."""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+class Command(BaseCommand):
+    help = ('Детерминированно наполняет базу синтетическими пользователями, '
+            'группами, постами, комментариями и подписками для замеров '
+            'производительности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=5000)
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--no-group-ratio', type=float, default=0.3,
+            help='Доля постов без группы.')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель распределения Ципфа для авторов, групп и '
+                 'постов: чем больше, тем сильнее перекос.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имен пользователей и slug групп.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        if User.objects.filter(
+                username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(
+                f'Данные с префиксом {self.prefix} уже есть: '
+                'укажите другой --prefix или очистите базу.')
+        # Даты отсчитываются от начала суток: повторный запуск с тем же
+        # --seed в тот же день дает те же данные.
+        self.now = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        for name, step in (('users', self.create_users),
+                           ('groups', self.create_groups),
+                           ('posts', self.create_posts),
+                           ('comments', self.create_comments),
+                           ('follows', self.create_follows),
+                           ('derived data', self.rebuild_derived)):
+            started = time.monotonic()
+            created = step()
+            self.stdout.write(
+                f'{name}: {created} за {time.monotonic() - started:.1f} с')
+
+    def bulk_create(self, model, objects):
+        objects = iter(objects)
+        created = 0
+        with transaction.atomic():
+            while True:
+                batch = list(islice(objects, self.batch_size))
+                if not batch:
+                    return created
+                model.objects.bulk_create(batch)
+                created += len(batch)
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def create_users(self):
+        password = make_password(BENCH_PASSWORD)
+        created = self.bulk_create(User, (
+            User(username=f'{self.prefix}_{number}',
+                 first_name=f'Автор {number}',
+                 password=password,
+                 date_joined=self.now)
+            for number in range(self.options['users'])
+        ))
+        self.user_ids = list(User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+        return created
+
+    def create_groups(self):
+        created = self.bulk_create(Group, (
+            Group(title=f'Группа {number}',
+                  slug=f'{self.prefix}-{number}',
+                  description=self.text(5, 20))
+            for number in range(self.options['groups'])
+        ))
+        self.group_ids = list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'
+        ).order_by('pk').values_list('pk', flat=True))
+        return created
+
+    def create_images(self):
+        names = []
+        for number, color in enumerate(IMAGE_COLORS):
+            buffer = BytesIO()
+            Image.new('RGB', IMAGE_SIZE, color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{self.prefix}_{number}.jpg',
+                ContentFile(buffer.getvalue())))
+        return names
+
+    def create_posts(self):
+        rng = self.rng
+        images = self.create_images() if self.options['image_ratio'] else []
+        author_weights = zipf_weights(len(self.user_ids), self.options['skew'])
+        group_weights = zipf_weights(
+            len(self.group_ids), self.options['skew'])
+        span = timedelta(days=self.options['days']).total_seconds()
+        dates = sorted(
+            self.now - timedelta(seconds=rng.random() * span)
+            for _ in range(self.options['posts']))
+
+        def posts():
+            for pub_date in dates:
+                group_id = None
+                if (self.group_ids
+                        and rng.random() >= self.options['no_group_ratio']):
+                    group_id = rng.choices(
+                        self.group_ids, cum_weights=group_weights)[0]
+                image = ''
+                if images and rng.random() < self.options['image_ratio']:
+                    image = rng.choice(images)
+                yield Post(
+                    text=self.text(5, 60),
+                    author_id=rng.choices(
+                        self.user_ids, cum_weights=author_weights)[0],
+                    group_id=group_id,
+                    image=image,
+                    pub_date=pub_date,
+                    modified=pub_date)
+
+        with explicit_dates(Post._meta.get_field('pub_date'),
+                            Post._meta.get_field('modified')):
+            created = self.bulk_create(Post, posts())
+        self.posts = list(Post.objects.filter(
+            author_id__in=self.user_ids
+        ).order_by('pk').values_list('pk', 'pub_date'))
+        return created
+
+    def create_comments(self):
+        rng = self.rng
+        if not self.posts:
+            return 0
+        # Чаще всего комментируют свежие посты.
+        hot_posts = self.posts[::-1]
+        post_weights = zipf_weights(len(hot_posts), self.options['skew'])
+
+        def comments():
+            for _ in range(self.options['comments']):
+                post_id, pub_date = rng.choices(
+                    hot_posts, cum_weights=post_weights)[0]
+                created = pub_date + (self.now - pub_date) * rng.random()
+                yield Comment(
+                    post_id=post_id,
+                    author_id=rng.choice(self.user_ids),
+                    text=self.text(2, 25),
+                    created=created)
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            return self.bulk_create(Comment, comments())
+
+    def create_follows(self):
+        rng = self.rng
+        author_weights = zipf_weights(len(self.user_ids), self.options['skew'])
+        wanted = min(self.options['follows'],
+                     len(self.user_ids) * (len(self.user_ids) - 1))
+        self.follows = set()
+        while len(self.follows) < wanted:
+            user_id = rng.choice(self.user_ids)
+            author_id = rng.choices(
+                self.user_ids, cum_weights=author_weights)[0]
+            if user_id != author_id:
+                self.follows.add((user_id, author_id))
+        return self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in sorted(self.follows)
+        ))
+
+    def rebuild_derived(self):
+        threads.fill_root_paths(Comment.objects)
+        timeline.rebuild()
+        for recount in (counters.recount_users, counters.recount_groups,
+                        counters.recount_posts):
+            recount(self.batch_size)
+        if search.is_available():
+            search.rebuild()
+        return 'ленты, счетчики и поиск'
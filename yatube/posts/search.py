@@ -0,0 +1,189 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+# Виртуальные таблицы FTS5 создает миграция 0014_search_index:
+# unicode61 приводит регистр кириллицы, remove_diacritics 2 сводит «ё»
+# к «е», префиксные индексы ускоряют запросы вида «слово*».
+POST_TABLE = 'posts_post_fts'
+COMMENT_TABLE = 'posts_comment_fts'
+
+# Вес совпадения в комментарии относительно совпадения в тексте поста.
+COMMENT_WEIGHT = 0.5
+
+MIN_TERM_LENGTH = 2
+MAX_TERMS = 8
+
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'иях', 'ах', 'ях', 'ов', 'ев', 'ей', 'ий', 'ый', 'ой', 'ая', 'яя',
+    'ое', 'ее', 'ие', 'ые', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ть',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def stem(word):
+    """Грубо отрезает окончание: «котами» и «коту» дают префикс «кот»."""
+    if len(word) > 3:
+        for ending in RUSSIAN_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= 3:
+                return word[:-len(ending)]
+    return word
+
+
+def build_query(text):
+    """Превращает пользовательский ввод в безопасный запрос FTS5.
+
+    Каждое слово становится префиксным термом, термы объединяются по И;
+    однобуквенные слова отбрасываются.
+    """
+    terms = [term for term in re.findall(r'\w+', text.lower())
+             if len(term) >= MIN_TERM_LENGTH][:MAX_TERMS]
+    return ' '.join(f'"{stem(term)}"*' for term in terms)
+
+
+def index_post(post, created=False):
+    """Индексирует пост; новому посту нечего удалять из индекса: id в
+    SQLite с AUTOINCREMENT не переиспользуются."""
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM {POST_TABLE} WHERE rowid = %s',
+                           [post.pk])
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text])
+
+
+def unindex_post(post_id):
+    """Убирает из индекса пост и его комментарии одним запросом на
+    таблицу; вызывается до каскадного удаления комментариев."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE} WHERE rowid = %s',
+                       [post_id])
+        cursor.execute(
+            f'DELETE FROM {COMMENT_TABLE} WHERE rowid IN '
+            '(SELECT id FROM posts_comment WHERE post_id = %s)', [post_id])
+
+
+def index_comment(comment, created=False):
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s',
+                           [comment.pk])
+        if comment.post_id is not None:
+            cursor.execute(
+                f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id) '
+                'VALUES (%s, %s, %s)',
+                [comment.pk, comment.text, comment.post_id])
+
+
+def unindex_comment(comment_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s',
+                       [comment_id])
+
+
+def index_new(posts, comments):
+    """Добавляет в индекс посты и комментарии, созданные bulk_create."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {POST_TABLE} (rowid, text) VALUES (%s, %s)',
+            [(post.pk, post.text) for post in posts])
+        cursor.executemany(
+            f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id) '
+            'VALUES (%s, %s, %s)',
+            [(comment.pk, comment.text, comment.post_id)
+             for comment in comments])
+
+
+def rebuild():
+    """Перестраивает индекс целиком, например после bulk_create."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE} (rowid, text) '
+            'SELECT id, text FROM posts_post')
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id) '
+            'SELECT id, text, post_id FROM posts_comment '
+            'WHERE post_id IS NOT NULL')
+        cursor.execute(
+            f"INSERT INTO {POST_TABLE} ({POST_TABLE}) VALUES ('optimize')")
+        cursor.execute(
+            f"INSERT INTO {COMMENT_TABLE} ({COMMENT_TABLE}) "
+            "VALUES ('optimize')")
+
+
+def filter_posts(queryset, text):
+    """Оставляет в queryset посты, текст которых совпал с запросом."""
+    query = build_query(text)
+    if not query:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {POST_TABLE} WHERE {POST_TABLE} MATCH %s',
+        [query]))
+
+
+class SearchResults:
+    """Ленивый ранжированный список постов для Paginator.
+
+    Paginator вызывает count() и срез; каждый срез — один запрос
+    к FTS-индексу за id и один запрос за самими постами.
+    """
+    MATCHES = (
+        f'SELECT rowid AS post_id, bm25({POST_TABLE}) AS score '
+        f'FROM {POST_TABLE} WHERE {POST_TABLE} MATCH %s '
+        'UNION ALL '
+        f'SELECT post_id, bm25({COMMENT_TABLE}) * {COMMENT_WEIGHT} '
+        f'FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s'
+    )
+
+    def __init__(self, text, queryset=None):
+        self.query = build_query(text)
+        if queryset is None:
+            queryset = Post.objects.select_related('author', 'group')
+        self.queryset = queryset
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = 0
+            if self.query:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT COUNT(DISTINCT post_id) '
+                        f'FROM ({self.MATCHES})',
+                        [self.query, self.query])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ids(self, offset, limit):
+        if not self.query:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM ({self.MATCHES}) '
+                'GROUP BY post_id ORDER BY MIN(score), post_id DESC '
+                'LIMIT %s OFFSET %s',
+                [self.query, self.query, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = self.count() if item.stop is None else item.stop
+        ids = self.ids(start, max(stop - start, 0))
+        posts = self.queryset.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
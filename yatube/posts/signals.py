@@ -0,0 +1,148 @@
+import threading
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, search, thumbnails, timeline
+from .cache import author_generations, invalidate, post_generations
+from .models import Comment, Follow, Post, User, UserStats
+
+# Поля автора, которые видны в закэшированных лентах.
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+# id постов, которые удаляются в текущем потоке: их комментарии
+# удаляются каскадом, и обновлять счетчик, поиск и кэш лент за каждый
+# незачем.
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._name_changed = False
+    if raw or instance._state.adding:
+        return
+    if (update_fields is not None
+            and not set(AUTHOR_NAME_FIELDS).intersection(update_fields)):
+        return
+    previous = User.objects.filter(pk=instance.pk).values(
+        *AUTHOR_NAME_FIELDS).first()
+    instance._name_changed = previous is not None and any(
+        previous[field] != getattr(instance, field)
+        for field in AUTHOR_NAME_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    elif instance._name_changed:
+        group_ids = list(Post.objects.filter(author=instance).values_list(
+            'group_id', flat=True).distinct())
+        if group_ids:
+            invalidate(*author_generations(instance.pk, group_ids))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = None
+    instance._image_changed = bool(instance.image)
+    if raw or instance._state.adding:
+        return
+    previous = Post.objects.filter(
+        pk=instance.pk).values('group_id', 'image').first()
+    if previous is not None:
+        instance._previous_group_id = previous['group_id']
+        instance._image_changed = previous['image'] != instance.image.name
+    if instance._image_changed:
+        instance.thumbnail = ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_user(instance.author_id, 1, 'posts_count')
+        counters.shift_group(instance.group_id, 1)
+        timeline.fan_out_post(instance)
+    elif instance._previous_group_id != instance.group_id:
+        counters.shift_group(instance._previous_group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+    if instance._image_changed and instance.image:
+        thumbnails.schedule(instance.pk)
+    if search.is_available():
+        search.index_post(instance, created)
+    invalidate(*post_generations(instance, instance._previous_group_id))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _deleting_posts().add(instance.pk)
+    if search.is_available():
+        search.unindex_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+    counters.shift_user(instance.author_id, -1, 'posts_count')
+    counters.shift_group(instance.group_id, -1)
+    invalidate(*post_generations(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_post(instance.post_id, 1)
+        # Число комментариев видно в лентах.
+        invalidate(*post_generations(instance.post))
+    if search.is_available():
+        search.index_comment(instance, created)
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_deleting(sender, instance, **kwargs):
+    # pre_delete всех объектов приходит до удаления строк, а post_delete
+    # комментариев — уже после удаления поста и снятия его отметки.
+    instance._post_deleting = instance.post_id in _deleting_posts()
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_post_deleting', False):
+        # Удаляемый пост сам убрал комментарии из поиска и сбросит свои
+        # ленты один раз, а его счетчик удаляется вместе с ним.
+        return
+    counters.shift_post(instance.post_id, -1)
+    if search.is_available():
+        search.unindex_comment(instance.pk)
+    post = Post.objects.filter(pk=instance.post_id).only(
+        'author_id', 'group_id').first()
+    if post is not None:
+        invalidate(*post_generations(post))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_user(instance.author_id, 1, 'followers_count')
+        counters.shift_user(instance.user_id, 1, 'following_count')
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, -1, 'followers_count')
+    counters.shift_user(instance.user_id, -1, 'following_count')
+    timeline.prune(instance.user_id, instance.author_id)
@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from posts import search, threads, thumbnails
+from posts.cache import (AUTHOR_FEED, GROUP_FEED, get_generation,
+                         get_generations)
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          UserStats)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedBenchTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, prefix):
+        call_command(
+            'seed_bench', users=20, groups=3, posts=60, comments=80,
+            follows=30, image_ratio=0.5, seed=7, prefix=prefix,
+            stdout=StringIO())
+        return Post.objects.filter(author__username__startswith=f'{prefix}_')
+
+    def test_seed_bench_creates_consistent_data(self):
+        """seed_bench детерминирован и строит производные данные."""
+        posts = self.seed('one')
+        self.assertEqual(posts.count(), 60)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(Follow.objects.count(), 30)
+        self.assertTrue(posts.exclude(image='').exists())
+        self.assertEqual(
+            sum(Group.objects.values_list('posts_count', flat=True)),
+            posts.exclude(group=None).count())
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(Post.objects.filter(author_id=author_id).count()
+                for author_id in Follow.objects.values_list(
+                    'author_id', flat=True)))
+        other_posts = self.seed('two')
+        self.assertEqual(
+            list(posts.order_by('pk').values_list('text', 'pub_date')),
+            list(other_posts.order_by('pk').values_list(
+                'text', 'pub_date')))
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='importer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Импорт', slug='import', description='Импорт')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_posts(self, path, **options):
+        call_command('import_posts', path, stdout=StringIO(),
+                     stderr=StringIO(), **options)
+
+    def test_import_jsonl_builds_derived_data(self):
+        """JSONL загружается с комментариями, датами и производными
+        данными; неверные записи пропускаются."""
+        records = (
+            {'author': 'importer', 'group': 'import', 'text': 'Первый',
+             'pub_date': '2020-01-02T03:04:05+00:00',
+             'comments': [{'author': 'reader', 'text': 'Ответ',
+                           'created': '2020-01-03T00:00:00'}]},
+            {'author': 'nobody', 'text': 'Чужой'},
+            {'author': 'importer', 'text': 'Второй'},
+        )
+        path = self.write('posts.jsonl', '\n'.join(map(json.dumps, records)))
+        self.import_posts(path, batch_size=2)
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.pub_date.year, 2020)
+        self.assertEqual(first.group, ImportPostsTest.group)
+        self.assertEqual(first.comments_count, 1)
+        self.assertEqual(first.comments.get().text, 'Ответ')
+        self.assertFalse(Post.objects.filter(text='Чужой').exists())
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=ImportPostsTest.reader).count(), 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        with open(f'{path}.checkpoint') as file:
+            self.assertEqual(json.load(file), {
+                'records': 3, 'offset': os.path.getsize(path), 'posts': 2,
+                'comments': 1, 'skipped': 1, 'done': True})
+        self.import_posts(path)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_import_csv_resumes_from_checkpoint(self):
+        """CSV продолжается с контрольной точки, а незакоммиченная пачка
+        загружается заново."""
+        first = ('type,author,group,text,date\n'
+                 'post,importer,,"Первый\nпост",2020-01-01T00:00:00\n'
+                 'comment,reader,,Ответ,2020-01-02T00:00:00\n')
+        path = self.write('posts.csv', first + (
+            'post,importer,import,Второй,\n'
+            'post,importer,,Третий,\n'))
+        self.import_posts(path, batch_size=1)
+        self.assertEqual(Comment.objects.get().post.text, 'Первый\nпост')
+        Post.objects.filter(text__in=('Второй', 'Третий')).delete()
+        state = {'records': 1, 'offset': len(first.encode()), 'posts': 1,
+                 'comments': 1, 'skipped': 0, 'done': False}
+        with open(f'{path}.checkpoint', 'w') as file:
+            json.dump(dict(state, records=2, offset=0, posts=2, pending={
+                'pk': 10 ** 6, 'author_id': ImportPostsTest.author.pk,
+                'pub_date': '2020-01-01T00:00:00+00:00',
+                'previous': state}), file)
+        self.import_posts(path, batch_size=1)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Второй', 'Первый\nпост', 'Третий'])
+
+    def test_import_updates_only_imported_posts(self):
+        """Производные данные пересчитываются только для загруженных
+        постов, а сбрасываются только поколения их лент."""
+        other = Group.objects.create(title='Другая', slug='other')
+        existing = Post.objects.create(author=ImportPostsTest.reader,
+                                       group=other, text='Старый')
+        Post.objects.filter(pk=existing.pk).update(comments_count=7)
+        untouched = (GROUP_FEED.format(other.pk),
+                     AUTHOR_FEED.format(ImportPostsTest.reader.pk))
+        before = get_generations(untouched)
+        cache.set('unrelated', 'value')
+        stats = UserStats.objects.get(user=ImportPostsTest.author)
+        path = self.write('posts.jsonl', json.dumps(
+            {'author': 'importer', 'group': 'import', 'text': 'Котики',
+             'comments': [{'author': 'reader', 'text': 'Собаки'}]}))
+        changed = get_generation(GROUP_FEED.format(ImportPostsTest.group.pk))
+        self.import_posts(path)
+        self.assertEqual(get_generations(untouched), before)
+        self.assertNotEqual(
+            get_generation(GROUP_FEED.format(ImportPostsTest.group.pk)),
+            changed)
+        self.assertEqual(cache.get('unrelated'), 'value')
+        existing.refresh_from_db()
+        self.assertEqual(existing.comments_count, 7)
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 1)
+        comment = Comment.objects.get(text='Собаки')
+        self.assertEqual(comment.path, threads.child_path('', comment.pk))
+        self.assertEqual(list(search.SearchResults('собака')[:1]),
+                         [comment.post])
+        self.assertEqual(
+            list(search.filter_posts(Post.objects, 'котик')),
+            [comment.post])
+
+    def test_export_round_trips_through_import(self):
+        """Выгрузка export_posts загружается обратно import_posts."""
+        post = Post.objects.create(author=ImportPostsTest.author,
+                                   group=ImportPostsTest.group,
+                                   text='Текст, с "кавычками"\nи строкой')
+        Comment.objects.create(post=post, author=ImportPostsTest.reader,
+                               text='Ответ')
+        for file_format in ('jsonl', 'csv'):
+            with self.subTest(file_format=file_format):
+                path = os.path.join(self.directory, f'export.{file_format}')
+                call_command('export_posts', author='importer',
+                             format=file_format, output=path)
+                Post.objects.all().delete()
+                self.import_posts(path)
+                imported = Post.objects.get()
+                self.assertEqual(
+                    (imported.text, imported.group, imported.pub_date),
+                    (post.text, post.group, post.pub_date))
+                self.assertEqual(imported.comments.get().text, 'Ответ')
+                post = imported
+
+
+class LoadTestCommandTest(TestCase):
+    def test_bad_mix_is_usage_error(self):
+        """Неверный --mix — ошибка использования, а не трассировка."""
+        for command in ('loadtest', 'benchmark_sqlite'):
+            for mix in ('index=50,unknown=1', 'index=много'):
+                with self.subTest(command=command, mix=mix):
+                    with self.assertRaisesMessage(CommandError, 'mix'):
+                        call_command(command, '--mix', mix)
+
+
+class GenerateThumbnailsTest(TestCase):
+    def test_broken_image_does_not_stop_worker(self):
+        """Ошибка картинки одного поста не мешает обработать остальные."""
+        author = User.objects.create_user(username='thumbnailer')
+        broken, fine = (
+            Post.objects.create(author=author, text='Пост',
+                                image=f'posts/{name}.jpg')
+            for name in ('broken', 'fine'))
+
+        def generate(post_id):
+            if post_id == broken.pk:
+                raise OSError('cannot identify image file')
+            return True
+
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch.object(thumbnails, 'generate',
+                               side_effect=generate) as generate_mock:
+            call_command('generate_thumbnails', stdout=stdout, stderr=stderr)
+        self.assertCountEqual(
+            [call.args[0] for call in generate_mock.call_args_list],
+            [broken.pk, fine.pk])
+        self.assertIn('Построено миниатюр: 1', stdout.getvalue())
+        self.assertIn(f'Пост {broken.pk}', stderr.getvalue())
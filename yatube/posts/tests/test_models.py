@@ -1,9 +1,15 @@
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from faker import Faker
 
-from posts.models import Group, Post
+from posts import search, timeline
+from posts.models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -63,3 +69,129 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.author = User.objects.create_user(
+            username=fake.user_name())
+        cls.reader = User.objects.create_user(
+            username=fake.user_name())
+        cls.group = Group.objects.create(
+            title=fake.name(),
+            slug=fake.slug(),
+            description=fake.text(),)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счетчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Текст',
+            group=CountersTest.group)
+        comment = Comment.objects.create(
+            post=post, author=CountersTest.reader, text='Комментарий')
+        follow = Follow.objects.create(
+            user=CountersTest.reader, author=CountersTest.author)
+        post.refresh_from_db()
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 1)
+        self.assertEqual(self.stats(CountersTest.author).followers_count, 1)
+        self.assertEqual(self.stats(CountersTest.reader).following_count, 1)
+        self.assertEqual(CountersTest.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(CountersTest.author).followers_count, 0)
+        self.assertEqual(self.stats(CountersTest.reader).following_count, 0)
+        post.group = None
+        post.save()
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 0)
+
+    def test_post_deletion_skips_per_comment_work(self):
+        """Каскадное удаление комментариев не обновляет удаляемый пост и
+        убирает их из поиска одним запросом."""
+        post = Post.objects.create(author=CountersTest.author, text='Пост')
+        for number in range(5):
+            Comment.objects.create(post=post, author=CountersTest.reader,
+                                   text=f'Комментарий котика {number}')
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(
+            [sql for sql in statements if 'comments_count' in sql], [])
+        self.assertEqual(
+            len([sql for sql in statements
+                 if sql.startswith(f'DELETE FROM {search.COMMENT_TABLE}')]),
+            1)
+        self.assertEqual(
+            list(search.SearchResults('котик')[:1]), [])
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters исправляет рассинхронизацию."""
+        Post.objects.bulk_create(
+            Post(author=CountersTest.author, text='Текст',
+                 group=CountersTest.group)
+            for _ in range(3)
+        )
+        UserStats.objects.filter(user=CountersTest.reader).delete()
+        call_command('recount_counters', batch_size=1, stdout=StringIO())
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 3)
+        self.assertEqual(self.stats(CountersTest.reader).posts_count, 0)
+        self.assertEqual(CountersTest.group.posts_count, 3)
+
+
+class QueryPlanTest(TestCase):
+    """Списки из posts/views.py читаются по составным индексам без
+    сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='planner')
+        cls.group = Group.objects.create(title='План', slug='plan')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Пост')
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.plan(queryset)
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_feeds_use_composite_indexes(self):
+        for ordering in (Post._meta.ordering, ('-pub_date', '-id')):
+            with self.subTest(ordering=ordering):
+                self.assertUsesIndex(
+                    self.author.posts.select_related(
+                        'author', 'group').order_by(*ordering)[:10],
+                    'post_author_pub_date_idx')
+                self.assertUsesIndex(
+                    self.group.posts.select_related(
+                        'author', 'group').order_by(*ordering)[:10],
+                    'post_group_pub_date_idx')
+
+    def test_root_comments_use_composite_index(self):
+        self.assertUsesIndex(
+            Comment.objects.select_related('author').filter(
+                post=self.post, parent=None).order_by('-created', '-id')[:10],
+            'comment_post_root_idx')
+
+    def test_fan_out_uses_covering_index(self):
+        self.assertIn(
+            'COVERING INDEX follow_author_user_idx',
+            self.plan(timeline.followers(self.author.pk)))
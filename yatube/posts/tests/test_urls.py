@@ -34,6 +34,7 @@ class PostUserURLTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(PostUserURLTests.user)
         self.authorized_client_2 = Client()
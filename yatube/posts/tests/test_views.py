@@ -1,16 +1,31 @@
+import json
+import os
 import shutil
 import tempfile
+import time
+from io import StringIO
 from random import randint
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.cache import get_cache_key
 from faker import Faker
 
-from ..models import Follow, Group, Post
+from core.decorators import query_budget
+from core.middleware import QueryBudgetExceeded, QueryBudgetMiddleware
+
+from .. import benchmarks, loadtest
+from .. import cache as post_cache
+from ..models import Comment, Follow, Group, Post, TimelineEntry
 from ..forms import PostForm
 
 User = get_user_model()
@@ -67,6 +82,73 @@ class PaginatorViewsTest(TestCase):
                                          post_number)
 
 
+@override_settings(PAGINATION_MODE='cursor')
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(
+            username=fake.user_name())
+        cls.group = Group.objects.create(
+            title=fake.name(),
+            slug=fake.slug(),
+            description=fake.text(),
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=fake.text(), group=cls.group)
+            for _ in range(settings.NUMBER_OF_POSTS * 2 + 3)
+        )
+        cls.expected = list(Post.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url, cursor_attr, start=''):
+        ids, cursor = [], start
+        while cursor is not None:
+            response = self.client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            ids.extend(post.id for post in page_obj)
+            cursor = getattr(page_obj, cursor_attr)
+        return ids, page_obj
+
+    def test_cursor_pages_cover_feed_in_order(self):
+        """Курсорная пагинация обходит ленту без пропусков и повторов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                ids, last_page = self.walk(url, 'next_cursor')
+                self.assertEqual(ids, self.expected)
+                self.assertFalse(last_page.has_next())
+                self.assertTrue(last_page.has_previous())
+                back_ids, first_page = self.walk(
+                    url, 'previous_cursor', last_page.previous_cursor)
+                self.assertFalse(first_page.has_previous())
+                self.assertEqual(
+                    sorted(back_ids, reverse=True),
+                    self.expected[:-len(last_page)])
+
+    def test_first_page_does_not_count(self):
+        """Первая страница не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор отдает первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.expected[:settings.NUMBER_OF_POSTS])
+
+
 @override_settings(MEDIA_ROOT=settings.MEDIA_ROOT)
 class PostPagesTests(TestCase):
     @classmethod
@@ -145,6 +227,20 @@ class PostPagesTests(TestCase):
         self.assertEqual(response.context['user_post'],
                          PostPagesTests.post)
 
+    def test_thumbnail_generated_out_of_band(self):
+        """До генерации миниатюры шаблон показывает исходную картинку."""
+        post = PostPagesTests.post
+        url = reverse('posts:post_detail', args=(post.pk,))
+        response = self.client.get(url)
+        self.assertContains(response, post.image.url)
+        call_command('generate_thumbnails', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        response = self.client.get(url)
+        self.assertContains(response, post.thumbnail.url)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.thumbnail.url)
+
     def test_image_correct_show(self):
         """Изображение передается в шаблон
         главной страницы, страницу профиля, группы, поста."""
@@ -168,15 +264,175 @@ class CasheIndexTests(TestCase):
             username=fake.user_name())
 
     def test_cache_index_page(self):
-        test_post = Post.objects.create(author=CasheIndexTests.user)
+        Post.objects.create(author=CasheIndexTests.user)
         response = self.client.get(reverse('posts:index'))
-        test_post.delete()
+        Post.objects.bulk_create([
+            Post(author=CasheIndexTests.user, text='Без сигналов')])
         response_2 = self.client.get(reverse('posts:index'))
         self.assertEqual(response.content, response_2.content)
         cache.clear()
         response_3 = self.client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, response_3.content)
 
+    def test_cached_pages_are_revalidated_by_browser(self):
+        """Срок серверной копии не уходит в браузер: иначе он часами
+        не увидел бы новый пост, подписку или комментарий."""
+        group = Group.objects.create(title='Кэш', slug='cache')
+        Post.objects.create(author=CasheIndexTests.user, group=group,
+                            text='Пост')
+        client = Client()
+        client.force_login(CasheIndexTests.user)
+        urls = (reverse('posts:index'), reverse('posts:follow_index'),
+                reverse('posts:group_rss', args=(group.slug,)))
+        for url in urls:
+            for attempt in ('miss', 'hit'):
+                with self.subTest(url=url, attempt=attempt):
+                    response = client.get(url)
+                    self.assertIn('max-age=0', response['Cache-Control'])
+
+    def test_post_changes_invalidate_index_page(self):
+        """Создание, редактирование и удаление поста сбрасывают кэш."""
+        cache.clear()
+        test_post = Post.objects.create(
+            author=CasheIndexTests.user, text='Первая версия')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Первая версия')
+        test_post.text = 'Вторая версия'
+        test_post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Вторая версия')
+        test_post.delete()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Вторая версия')
+
+    def test_comments_invalidate_feed_pages(self):
+        """Новый и удаленный комментарий обновляют число комментариев
+        во всех лентах поста."""
+        group = Group.objects.create(title='Группа', slug='comments-group')
+        post = Post.objects.create(
+            author=CasheIndexTests.user, group=group, text='Пост')
+        reader = User.objects.create_user(username='comments-reader')
+        Follow.objects.create(user=reader, author=CasheIndexTests.user)
+        client = Client()
+        client.force_login(reader)
+        urls = (reverse('posts:index'),
+                reverse('posts:group_posts', args=(group.slug,)),
+                reverse('posts:profile',
+                        args=(CasheIndexTests.user.username,)),
+                reverse('posts:follow_index'))
+        for url in urls:
+            self.assertContains(client.get(url), 'Комментариев: 0')
+        comment = Comment.objects.create(
+            post=post, author=reader, text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Комментариев: 1')
+        comment.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Комментариев: 0')
+
+    def test_author_name_change_invalidates_feed_pages(self):
+        """Новое имя автора сразу видно в лентах; вход пользователя
+        поколения не сбрасывает."""
+        author = User.objects.create_user(username='renamed')
+        Post.objects.create(author=author, text='Пост')
+        url = reverse('posts:index')
+        self.client.get(url)
+        author.first_name, author.last_name = 'Новое', 'Имя'
+        author.save()
+        self.assertContains(self.client.get(url), 'Новое Имя')
+        with mock.patch.object(post_cache, 'bump_generation') as bump:
+            self.client.force_login(author)
+        bump.assert_not_called()
+
+    def test_post_deletion_bumps_once_for_all_comments(self):
+        """Каскадное удаление комментариев поста не сбрасывает
+        поколения за каждый комментарий."""
+        post = Post.objects.create(author=CasheIndexTests.user, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=CasheIndexTests.user, text=str(n))
+            for n in range(20))
+        with mock.patch.object(post_cache, 'bump_generation') as bump:
+            post.delete()
+        self.assertEqual(bump.call_count, 1)
+
+    def test_stale_page_served_while_rebuilding(self):
+        """Пока страницу пересобирает другой запрос, отдается старая копия."""
+        cache.clear()
+        url = reverse('posts:index')
+        Post.objects.create(author=CasheIndexTests.user, text='Старая')
+        self.client.get(url)
+        Post.objects.create(author=CasheIndexTests.user, text='Новая')
+        key = get_cache_key(RequestFactory().get(url),
+                            post_cache.INDEX_PAGE, cache=cache)
+        lock = post_cache._acquire(key)
+        response = self.client.get(url)
+        self.assertContains(response, 'Старая')
+        self.assertNotContains(response, 'Новая')
+        post_cache._release(lock)
+        self.assertContains(self.client.get(url), 'Новая')
+
+    def test_rebuild_lock_is_exclusive_until_expired(self):
+        """Блокировку пересборки берет один запрос; брошенную после
+        LOCK_TIMEOUT можно забрать."""
+        lock = post_cache._acquire('page')
+        self.addCleanup(post_cache._release, lock)
+        self.assertIsNotNone(lock)
+        self.assertIsNone(post_cache._acquire('page'))
+        self.assertIsNotNone(post_cache._acquire('other'))
+        expired = time.time() - post_cache.LOCK_TIMEOUT - 1
+        os.utime(lock, (expired, expired))
+        self.assertEqual(post_cache._acquire('page'), lock)
+
+    def test_early_refresh_rebuilds_before_expiry(self):
+        """Досрочное обновление пересобирает страницу до срока."""
+        cache.clear()
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.bulk_create([
+            Post(author=CasheIndexTests.user, text='Без сигналов')])
+        self.assertNotContains(self.client.get(url), 'Без сигналов')
+        with mock.patch.object(post_cache, 'EARLY_REFRESH_BETA', 10 ** 12):
+            self.assertContains(self.client.get(url), 'Без сигналов')
+
+
+class ArticleFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(
+            username=fake.user_name())
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Исходный текст')
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+
+    def get_profile(self):
+        return self.client.get(reverse(
+            'posts:profile', args=(ArticleFragmentCacheTests.user,)))
+
+    def test_article_fragment_cached_until_post_changes(self):
+        """Фрагмент поста берется из кэша, пока пост не изменится."""
+        post = ArticleFragmentCacheTests.post
+        self.assertContains(self.get_profile(), 'Исходный текст')
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
+        self.assertContains(self.get_profile(), 'Исходный текст')
+        post.text = 'Новый текст'
+        post.save()
+        self.assertContains(self.get_profile(), 'Новый текст')
+
+    def test_article_fragment_follows_author_name(self):
+        """Смена имени автора обновляет фрагмент поста."""
+        self.get_profile()
+        user = ArticleFragmentCacheTests.user
+        user.first_name = 'Лев'
+        user.last_name = 'Толстой'
+        user.save()
+        self.assertContains(self.get_profile(), 'Автор: Лев Толстой')
+
 
 class PostPagesTestsForUsers(TestCase):
     @classmethod
@@ -236,6 +492,7 @@ class FollowTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_follower = Client()
         self.authorized_follower.force_login(FollowTests.follower)
         self.authorized_follower_2 = Client()
@@ -365,3 +622,614 @@ class FollowTests(TestCase):
             reverse('posts:follow_index'))
         all_posts = response.context['page_obj']
         self.assertNotIn(test_post, all_posts)
+
+    def test_timeline_backfill_and_prune(self):
+        """Подписка дополняет ленту старыми постами, отписка очищает её."""
+        fake = Faker()
+        new_following = User.objects.create_user(
+            username=fake.user_name())
+        old_post = Post.objects.create(
+            text=fake.text(),
+            author=new_following)
+        self.authorized_follower.get(reverse(
+            'posts:profile_follow', args=(new_following.username,)))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=FollowTests.follower, post=old_post).exists())
+        response = self.authorized_follower.get(
+            reverse('posts:follow_index'))
+        self.assertIn(old_post, response.context['page_obj'])
+        self.authorized_follower.get(reverse(
+            'posts:profile_unfollow', args=(new_following.username,)))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=FollowTests.follower, author=new_following).exists())
+        response = self.authorized_follower.get(
+            reverse('posts:follow_index'))
+        self.assertNotIn(old_post, response.context['page_obj'])
+
+    def test_follow_index_cached_per_user(self):
+        """Лента подписок кэшируется для каждого читателя и сбрасывается
+        постом автора, подпиской и отпиской."""
+        url = reverse('posts:follow_index')
+        Follow.objects.create(
+            user=FollowTests.follower, author=FollowTests.following)
+        response = self.authorized_follower.get(url)
+        self.assertIn(FollowTests.post, response.context['page_obj'])
+        self.assertIsNone(self.authorized_follower.get(url).context)
+        response = self.authorized_follower_2.get(url)
+        self.assertNotIn(FollowTests.post, response.context['page_obj'])
+        Post.objects.create(author=FollowTests.following, text='Свежая')
+        self.assertContains(self.authorized_follower.get(url), 'Свежая')
+        self.assertNotContains(self.authorized_follower_2.get(url),
+                               'Свежая')
+        self.authorized_follower.get(reverse(
+            'posts:profile_unfollow',
+            args=(FollowTests.following.username,)))
+        self.assertNotContains(self.authorized_follower.get(url), 'Свежая')
+
+    def test_post_of_popular_author_bumps_few_generations(self):
+        """Пост автора с тысячами подписчиков сбрасывает только поколения
+        своих лент, а ленты подписок все равно обновляются."""
+        User.objects.bulk_create(
+            User(username=f'reader{number}') for number in range(3000))
+        readers = User.objects.filter(username__startswith='reader')
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=FollowTests.following)
+            for reader in readers)
+        reader = Client()
+        reader.force_login(readers.last())
+        url = reverse('posts:follow_index')
+        reader.get(url)
+        with mock.patch.object(post_cache, 'bump_generation',
+                               wraps=post_cache.bump_generation) as bump:
+            Post.objects.create(author=FollowTests.following, text='Свежая')
+        self.assertEqual(TimelineEntry.objects.filter(
+            post__text='Свежая').count(), 3000)
+        bumped = {name for call in bump.call_args_list for name in call[0]}
+        self.assertEqual(bumped, {
+            post_cache.INDEX_PAGE,
+            post_cache.AUTHOR_FEED.format(FollowTests.following.pk)})
+        self.assertContains(reader.get(url), 'Свежая')
+
+    def test_follow_feed_keys_have_no_generations(self):
+        """Ключ ленты подписок меняется с каждым постом, поэтому для него
+        не заводится вечный ключ поколения."""
+        Follow.objects.create(user=FollowTests.follower,
+                              author=FollowTests.following)
+        url = reverse('posts:follow_index')
+        with mock.patch.object(post_cache, 'get_generation',
+                               wraps=post_cache.get_generation) as lookup:
+            for number in range(3):
+                Post.objects.create(author=FollowTests.following,
+                                    text=f'Пост номер {number}')
+                response = self.authorized_follower.get(url)
+                self.assertContains(response, f'Пост номер {number}')
+        self.assertEqual(
+            [call for call in lookup.call_args_list
+             if call[0][0].startswith('follow_feed')], [])
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.author = User.objects.create_user(
+            username=fake.user_name())
+        cls.reader = User.objects.create_user(
+            username=fake.user_name())
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text=fake.text())
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text=fake.text())
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(QueryBudgetTests.reader)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Число запросов post_detail и follow_index не зависит от данных."""
+        fake = Faker()
+        urls = (
+            reverse('posts:post_detail', args=(QueryBudgetTests.post.pk,)),
+            reverse('posts:follow_index'),
+        )
+        before = [self.count_queries(url) for url in urls]
+        parent = QueryBudgetTests.comment
+        for _ in range(5):
+            Comment.objects.create(
+                post=QueryBudgetTests.post,
+                author=User.objects.create_user(username=fake.user_name()),
+                text=fake.text())
+            parent = Comment.objects.create(
+                post=QueryBudgetTests.post, parent=parent,
+                author=QueryBudgetTests.author, text=fake.text())
+            Post.objects.create(
+                author=QueryBudgetTests.author, text=fake.text())
+        cache.clear()
+        after = [self.count_queries(url) for url in urls]
+        self.assertEqual(before, after)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_budget_overrun_raises(self):
+        """Превышение лимита запросов приводит к исключению."""
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(Post.objects.all())
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = QueryBudgetMiddleware(get_response)
+        request = RequestFactory().get('/')
+        request.resolver_match = type(
+            'Match', (), {'view_name': 'test'})()
+        with self.assertRaises(QueryBudgetExceeded):
+            middleware(request)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(
+            username=fake.user_name())
+        cls.cat_post = Post.objects.create(
+            author=cls.user,
+            text='Сегодня гладил котов во дворе')
+        cls.dog_post = Post.objects.create(
+            author=cls.user,
+            text='Собака лаяла всю ночь')
+        Comment.objects.create(
+            post=cls.dog_post,
+            author=cls.user,
+            text='А у соседа был кот')
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_ranks_posts_and_comments(self):
+        """Поиск находит словоформы в постах и комментариях."""
+        self.assertEqual(
+            self.found('коты'),
+            [SearchTests.cat_post, SearchTests.dog_post])
+        self.assertEqual(self.found('СОБАКИ'), [SearchTests.dog_post])
+        self.assertEqual(self.found('!!!'), [])
+
+    def test_search_index_follows_changes(self):
+        """Правка и удаление поста обновляют индекс."""
+        post = Post.objects.get(pk=SearchTests.cat_post.pk)
+        post.text = 'Теперь здесь про попугая'
+        post.save()
+        self.assertEqual(self.found('попугай'), [post])
+        self.assertNotIn(post, self.found('кот'))
+        post.delete()
+        self.assertEqual(self.found('попугай'), [])
+
+
+@override_settings(NUMBER_OF_COMMENTS=3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(username=fake.user_name())
+        cls.post = Post.objects.create(author=cls.user, text=fake.text())
+        for number in range(5):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Комментарий {number}')
+
+    def test_post_detail_inlines_first_page(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        comments = response.context['comments']
+        self.assertEqual([comment.text for comment in comments], [
+            'Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        self.assertContains(
+            response, f'?comments={comments.next_cursor}', count=2)
+
+    def test_fragment_returns_next_page(self):
+        """Фрагмент отдает следующую страницу без кнопки в конце."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        cursor = response.context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'comments': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 1', 'Комментарий 0'])
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов post_detail не зависит от числа комментариев."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.user, text='Еще')
+            for _ in range(50)])
+        with CaptureQueriesContext(connection) as more_queries:
+            response = self.client.get(url)
+        self.assertEqual(len(more_queries), len(queries))
+        self.assertEqual(len(response.context['comments']), 3)
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(username=fake.user_name())
+        cls.post = Post.objects.create(author=cls.user, text=fake.text())
+        cls.root = cls.comment('Корень')
+        cls.reply = cls.comment('Ответ', cls.root)
+        cls.deep = cls.comment('Глубокий ответ', cls.reply)
+        cls.newer_root = cls.comment('Новый корень')
+
+    @classmethod
+    def comment(cls, text, parent=None):
+        return Comment.objects.create(
+            post=cls.post, author=cls.user, text=text, parent=parent)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(CommentThreadTests.user)
+
+    def test_path_orders_thread_depth_first(self):
+        """Путь ответа продолжает путь родителя."""
+        self.assertEqual(self.deep.depth, 2)
+        self.assertTrue(self.deep.path.startswith(self.reply.path + '.'))
+        self.assertTrue(self.reply.path.startswith(self.root.path + '.'))
+        self.assertEqual(
+            list(Comment.objects.filter(post=self.post).order_by(
+                'path').values_list('text', flat=True)),
+            ['Корень', 'Ответ', 'Глубокий ответ', 'Новый корень'])
+
+    @override_settings(COMMENT_MAX_DEPTH=2)
+    def test_reply_deeper_than_limit_becomes_sibling(self):
+        """Ответ глубже предела становится соседом родителя."""
+        too_deep = self.comment('Слишком глубоко', self.deep)
+        self.assertEqual(too_deep.parent_id, self.reply.pk)
+        self.assertEqual(too_deep.depth, 2)
+        self.assertEqual(too_deep.path.rpartition('.')[0], self.reply.path)
+
+    @override_settings(COMMENT_COLLAPSE_DEPTH=1)
+    def test_deep_branches_are_collapsed(self):
+        """Ветки глубже COMMENT_COLLAPSE_DEPTH подгружаются по кнопке."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        thread = response.context['thread']
+        self.assertEqual([comment.text for comment in thread],
+                         ['Новый корень', 'Корень', 'Ответ'])
+        self.assertEqual(thread[2].hidden_replies, 1)
+        replies_url = reverse('posts:comment_replies',
+                              args=(self.post.pk, self.reply.pk))
+        self.assertContains(response, replies_url)
+        response = self.client.get(replies_url)
+        self.assertEqual(
+            [comment.text for comment in response.context['thread']],
+            ['Глубокий ответ'])
+
+    def test_reply_via_form(self):
+        """Ответ создается формой, но только на комментарий того же
+        поста."""
+        url = reverse('posts:add_comment', args=(self.post.pk,))
+        self.authorized_client.post(
+            url, {'text': 'Ответ формой', 'parent': self.newer_root.pk})
+        self.assertEqual(
+            Comment.objects.get(text='Ответ формой').parent,
+            self.newer_root)
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(other_post.pk,)),
+            {'text': 'Чужая ветка', 'parent': self.root.pk})
+        self.assertFalse(
+            Comment.objects.filter(text='Чужая ветка').exists())
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail', args=(self.post.pk,)),
+            {'reply_to': self.root.pk})
+        self.assertContains(response, f'href="#comment-{self.root.pk}"')
+        self.assertEqual(list(response.context['form'].fields), ['text'])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.author = User.objects.create_user(username=fake.user_name())
+        cls.reader = User.objects.create_user(username=fake.user_name())
+        cls.staff = User.objects.create_user(
+            username=fake.user_name(), is_staff=True)
+        cls.group = Group.objects.create(
+            title=fake.word(), slug=fake.slug(), description=fake.text())
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Запись {number}',
+                                group=cls.group if number else None)
+            for number in range(3)]
+        Post.objects.create(author=cls.reader, text='Чужая запись')
+        for number in range(2):
+            Comment.objects.create(post=cls.posts[1], author=cls.reader,
+                                   text=f'Ответ {number}')
+
+    def export(self, user, file_format):
+        client = Client()
+        client.force_login(user)
+        return client.get(reverse('posts:profile_export', args=(
+            ExportTests.author.username, file_format)))
+
+    def test_jsonl_export_streams_posts_with_comments(self):
+        """JSONL-выгрузка содержит посты автора с комментариями."""
+        response = self.export(ExportTests.author, 'jsonl')
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        records = [json.loads(line) for line in b''.join(
+            response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['text'] for record in records],
+                         ['Запись 0', 'Запись 1', 'Запись 2'])
+        self.assertIsNone(records[0]['group'])
+        self.assertEqual(records[1]['group'], ExportTests.group.slug)
+        self.assertEqual([comment['text'] for comment in
+                          records[1]['comments']], ['Ответ 0', 'Ответ 1'])
+        self.assertEqual(records[2]['comments'], [])
+
+    def test_csv_export_lists_comments_after_post(self):
+        """В CSV строки comment идут за своим постом."""
+        response = self.export(ExportTests.staff, 'csv')
+        rows = [row.split(',')[:1] + row.split(',')[3:4] for row in b''.join(
+            response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [
+            ['type', 'text'], ['post', 'Запись 0'], ['post', 'Запись 1'],
+            ['comment', 'Ответ 0'], ['comment', 'Ответ 1'],
+            ['post', 'Запись 2']])
+
+    def test_export_is_private(self):
+        """Выгрузку получают только автор и сотрудники."""
+        self.assertEqual(
+            self.export(ExportTests.reader, 'jsonl').status_code, 403)
+        self.assertEqual(
+            self.export(ExportTests.author, 'xml').status_code, 404)
+        response = self.client.get(reverse('posts:profile_export', args=(
+            ExportTests.author.username, 'csv')))
+        self.assertEqual(response.status_code, 302)
+
+
+class JsonFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(
+            username=fake.user_name())
+        cls.group = Group.objects.create(
+            title=fake.name(),
+            slug=fake.slug(),
+            description=fake.text(),
+        )
+        cls.other_group = Group.objects.create(
+            title=fake.name(),
+            slug=fake.slug(),
+            description=fake.text(),
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text=fake.text())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_list_posts(self):
+        """JSON-ленты отдают посты группы, автора и главной."""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts',
+                    kwargs={'slug': JsonFeedTests.group.slug}),
+            reverse('posts:api_profile',
+                    kwargs={'username': JsonFeedTests.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(data['results'][0]['id'],
+                                 JsonFeedTests.post.pk)
+                self.assertEqual(data['results'][0]['group'],
+                                 JsonFeedTests.group.slug)
+                self.assertIsNone(data['next'])
+        response = self.client.get(reverse(
+            'posts:api_group_posts', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        """Неизменная лента отвечает 304 без запроса постов."""
+        url = reverse('posts:api_group_posts',
+                      kwargs={'slug': JsonFeedTests.group.slug})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.get(pk=JsonFeedTests.post.pk)
+        post.group = JsonFeedTests.other_group
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_comment_changes_etag(self):
+        """Новый комментарий меняет ETag лент поста: клиент не получит
+        304 с устаревшим comments_count."""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts',
+                    kwargs={'slug': JsonFeedTests.group.slug}),
+            reverse('posts:api_profile',
+                    kwargs={'username': JsonFeedTests.user.username}),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(post=JsonFeedTests.post,
+                               author=JsonFeedTests.user, text='Новый')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.json()['results'][0]['comments_count'], 1)
+
+
+class SyndicationFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fake = Faker()
+        cls.user = User.objects.create_user(
+            username=fake.user_name())
+        cls.group = Group.objects.create(
+            title=fake.name(),
+            slug=fake.slug(),
+            description=fake.text(),
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Первая запись ленты')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_render(self):
+        """RSS и Atom ленты группы и автора содержат посты."""
+        feeds = {
+            reverse('posts:group_rss', args=(
+                SyndicationFeedTests.group.slug,)): 'application/rss+xml',
+            reverse('posts:group_atom', args=(
+                SyndicationFeedTests.group.slug,)): 'application/atom+xml',
+            reverse('posts:profile_rss', args=(
+                SyndicationFeedTests.user.username,)): 'application/rss+xml',
+            reverse('posts:profile_atom', args=(
+                SyndicationFeedTests.user.username,)): 'application/atom+xml',
+        }
+        for url, content_type in feeds.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type))
+                self.assertContains(response, 'Первая запись ленты')
+        response = self.client.get(
+            reverse('posts:group_rss', args=('missing',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_cached_until_post_changes(self):
+        """Лента кэшируется, отвечает 304 и сбрасывается правкой поста."""
+        url = reverse('posts:group_rss',
+                      args=(SyndicationFeedTests.group.slug,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304)
+            self.client.get(url)
+        self.assertEqual(len(queries), 3)
+        post = Post.objects.get(pk=SyndicationFeedTests.post.pk)
+        post.text = 'Исправленная запись'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленная запись')
+
+    def test_last_modified_grows_when_newest_post_deleted(self):
+        """Удаление самого нового поста не отдает 304 по
+        If-Modified-Since."""
+        url = reverse('posts:group_rss',
+                      args=(SyndicationFeedTests.group.slug,))
+        newest = Post.objects.create(
+            author=SyndicationFeedTests.user,
+            group=SyndicationFeedTests.group, text='Удаляемая запись')
+        last_modified = self.client.get(url)['Last-Modified']
+        later = time.time_ns() + 2 * 10 ** 9
+        with mock.patch.object(post_cache.time, 'time_ns',
+                               return_value=later):
+            newest.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Удаляемая запись')
+
+    def test_atom_author_link_is_absolute(self):
+        """Ссылка на автора в Atom содержит домен."""
+        response = self.client.get(reverse(
+            'posts:group_atom', args=(SyndicationFeedTests.group.slug,)))
+        profile = reverse('posts:profile',
+                          args=(SyndicationFeedTests.user.username,))
+        self.assertContains(response, f'<uri>http://testserver{profile}</uri>')
+
+
+class BenchmarkViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_bench', users=10, groups=2, posts=30, comments=20,
+            follows=15, image_ratio=0, stdout=StringIO())
+
+    def test_benchmark_measures_every_view(self):
+        """Бенчмарк проходит все сценарии и не меняет базу."""
+        posts_count = Post.objects.count()
+        results = benchmarks.run(iterations=2, warmup=0)
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment'})
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertGreater(results['index']['bytes'], 0)
+        self.assertEqual(benchmarks.compare(results, results, 0), [])
+        slower = {name: dict(result, p95_ms=result['p95_ms'] * 2 + 1,
+                             queries=result['queries'] + 1)
+                  for name, result in results.items()}
+        self.assertEqual(
+            len(benchmarks.compare(slower, results, 0.2)),
+            2 * len(results))
+
+
+class LoadTestTests(TransactionTestCase):
+    def setUp(self):
+        call_command(
+            'seed_bench', users=10, groups=2, posts=30, comments=20,
+            follows=15, image_ratio=0, stdout=StringIO())
+
+    def test_load_test_reports_mixed_traffic(self):
+        """Нагрузочный тест проходит все сценарии без ошибок."""
+        comments_count = Comment.objects.count()
+        with override_settings(DEBUG=False):
+            result = loadtest.LoadTest(
+                loadtest.WsgiTransport(), threads=1, duration=1).run()
+        self.assertEqual(
+            set(result['scenarios']),
+            {'index', 'group', 'follow', 'comment'})
+        self.assertEqual(result['total']['errors'], {})
+        self.assertEqual(
+            Comment.objects.count(),
+            comments_count + result['scenarios']['comment']['requests'])
+
+    def test_classify(self):
+        """Блокировка SQLite и HTTP-ошибки считаются отдельно."""
+        self.assertEqual(
+            loadtest.classify(500, b'OperationalError: database is locked'),
+            loadtest.LOCKED)
+        self.assertEqual(loadtest.classify(403, b''), 'HTTP 403')
+        self.assertIsNone(loadtest.classify(302, b''))
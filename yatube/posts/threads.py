@@ -0,0 +1,65 @@
+"""Ветки комментариев на материализованном пути.
+
+Путь комментария — id его предков и его собственный id, дополненные
+нулями до PATH_DIGITS знаков и разделенные точкой. Сортировка по пути
+дает обход ветки в глубину, а все потомки комментария с путем P лежат
+в диапазоне P < path < P + PATH_END индекса (post, path).
+"""
+from collections import defaultdict
+
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+
+PATH_DIGITS = 10
+PATH_SEPARATOR = '.'
+# Символ сразу после разделителя: граница диапазона потомков.
+PATH_END = chr(ord(PATH_SEPARATOR) + 1)
+
+
+def child_path(parent_path, pk):
+    segment = str(pk).zfill(PATH_DIGITS)
+    if not parent_path:
+        return segment
+    return f'{parent_path}{PATH_SEPARATOR}{segment}'
+
+
+def fill_root_paths(queryset):
+    """Пути корневых комментариев, созданных bulk_create, одним UPDATE."""
+    return queryset.filter(path='', parent=None).update(path=LPad(
+        Cast('pk', CharField()), PATH_DIGITS, Value('0')))
+
+
+def with_replies(parents, queryset, visible_depth):
+    """Родители одной глубины из одного поста и их ответы в порядке
+    обхода ветки.
+
+    Ответы выбираются одним запросом по диапазону путей от первого до
+    последнего родителя; ответы на комментарии между ними, не вошедшие
+    в parents, отбрасываются. Ответы глубже visible_depth не
+    показываются: их число у ближайшего видимого предка записывается
+    в hidden_replies.
+    """
+    parents = list(parents)
+    if not parents:
+        return []
+    paths = [parent.path for parent in parents]
+    depth = parents[0].depth
+    replies = defaultdict(list)
+    width = len(paths[0])
+    for reply in queryset.filter(
+            post_id=parents[0].post_id,
+            path__gt=min(paths), path__lt=max(paths) + PATH_END,
+            depth__gt=depth, depth__lte=visible_depth + 1).order_by('path'):
+        replies[reply.path[:width]].append(reply)
+    thread = []
+    for parent in parents:
+        parent.hidden_replies = 0
+        thread.append(parent)
+        for reply in replies[parent.path]:
+            if reply.depth > visible_depth:
+                # В порядке пути скрытому ответу предшествует его родитель.
+                thread[-1].hidden_replies += 1
+                continue
+            reply.hidden_replies = 0
+            thread.append(reply)
+    return thread
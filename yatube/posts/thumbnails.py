@@ -0,0 +1,74 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from .cache import invalidate, post_generations
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_GEOMETRY = '660x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def generate(post_id):
+    """Строит миниатюру картинки поста и сохраняет ее в Post.thumbnail.
+
+    Возвращает True, если миниатюра сохранена.
+    """
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id').first()
+    if post is None or not post.image:
+        return False
+    thumbnail = get_thumbnail(
+        post.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+    if not thumbnail.exists():
+        logger.warning('Не удалось построить миниатюру для поста %s',
+                       post_id)
+        return False
+    updated = Post.objects.filter(
+        pk=post_id, image=post.image.name
+    ).update(thumbnail=thumbnail.name, modified=timezone.now())
+    if updated:
+        invalidate(*post_generations(post))
+    return bool(updated)
+
+
+def _generate_in_worker(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Ошибка генерации миниатюры для поста %s', post_id)
+    finally:
+        connections.close_all()
+
+
+def pending():
+    """Посты с картинкой, для которых еще нет миниатюры."""
+    return Post.objects.exclude(image='').filter(thumbnail='')
+
+
+def schedule(post_id):
+    """Ставит генерацию миниатюры в пул потоков после коммита.
+
+    При POST_THUMBNAIL_WORKERS = 0 пул не используется: пост остается
+    в pending() до обработки командой generate_thumbnails --watch.
+    """
+    if settings.POST_THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_generate_in_worker, post_id))
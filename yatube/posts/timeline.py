@@ -0,0 +1,90 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Follow, Post, TimelineEntry
+
+
+def _insert(entries):
+    """Вставляет строки ленты пачками, не материализуя весь генератор."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def followers(author_id):
+    """id подписчиков автора."""
+    return Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    _insert(
+        TimelineEntry(user_id=user_id,
+                      post_id=post.pk,
+                      author_id=post.author_id,
+                      pub_date=post.pub_date)
+        for user_id in followers(post.author_id).iterator()
+    )
+
+
+def fan_out_posts(posts):
+    """Раскладывает пачку новых постов, например после bulk_create, в ленты
+    подписчиков их авторов."""
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    _insert(
+        TimelineEntry(user_id=user_id,
+                      post_id=post.pk,
+                      author_id=author_id,
+                      pub_date=post.pub_date)
+        for author_id, user_id in Follow.objects.filter(
+            author_id__in=list(by_author)).values_list(
+                'author_id', 'user_id').iterator()
+        for post in by_author[author_id]
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id,
+                      post_id=post_id,
+                      author_id=author_id,
+                      pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Перестраивает все ленты одним INSERT ... SELECT, например после
+    bulk_create подписок и постов."""
+    tables = {
+        'timeline': TimelineEntry._meta.db_table,
+        'follow': Follow._meta.db_table,
+        'post': Post._meta.db_table,
+    }
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {timeline} (user_id, post_id, author_id, '
+                'pub_date) SELECT follow.user_id, post.id, post.author_id, '
+                'post.pub_date FROM {follow} follow JOIN {post} post '
+                'ON post.author_id = follow.author_id '
+                'ORDER BY follow.user_id, post.pub_date'.format(**tables))
@@ -1,18 +1,40 @@
 from django.urls import path
 
 from . import views
+from .feeds import (AuthorPostsAtomFeed, AuthorPostsFeed,
+                    GroupPostsAtomFeed, GroupPostsFeed, author_feed_state,
+                    group_feed_state)
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug>/', views.group_posts, name='group_posts'),
+    path('group/<slug>/rss/', group_feed_state(GroupPostsFeed()),
+         name='group_rss'),
+    path('group/<slug>/atom/', group_feed_state(GroupPostsAtomFeed()),
+         name='group_atom'),
+    path('search/', views.search, name='search'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/rss/',
+         author_feed_state(AuthorPostsFeed()),
+         name='profile_rss'),
+    path('profile/<str:username>/atom/',
+         author_feed_state(AuthorPostsAtomFeed()),
+         name='profile_atom'),
+    path('profile/<str:username>/export/<str:file_format>/',
+         views.profile_export,
+         name='profile_export'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('posts/<int:post_id>/comments/<int:comment_id>/replies/',
+         views.comment_replies,
+         name='comment_replies'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow,
@@ -20,4 +42,9 @@ urlpatterns = [
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow,
          name='profile_unfollow'),
+    path('api/posts/', views.api_index, name='api_index'),
+    path('api/group/<slug>/', views.api_group_posts,
+         name='api_group_posts'),
+    path('api/profile/<str:username>/', views.api_profile,
+         name='api_profile'),
 ]
@@ -1,9 +1,160 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+from contextlib import contextmanager
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+CURSOR_FORWARD = 'next'
+CURSOR_BACKWARD = 'prev'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: без номера и без COUNT(*)."""
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по полям ordering.
 
+    Каждая страница выбирается диапазоном по индексу
+    вида WHERE (pub_date, id) < (...) ORDER BY ... LIMIT per_page + 1,
+    поэтому стоимость не зависит от глубины страницы.
+    """
+    is_cursor = True
 
-def get_page_count(queryset, request):
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id')):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            self._field(name).value_to_string(obj) for name in self.fields
+        ]
+        raw = json.dumps([direction] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, *values = json.loads(raw.decode())
+            if (direction not in (CURSOR_FORWARD, CURSOR_BACKWARD)
+                    or len(values) != len(self.fields)):
+                raise InvalidCursor(cursor)
+            return direction, [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+
+    def get_page(self, cursor):
+        """Возвращает страницу по курсору; битый курсор — первая страница."""
+        if cursor:
+            try:
+                return self.page(*self.decode_cursor(cursor))
+            except InvalidCursor:
+                pass
+        return self.page(CURSOR_FORWARD, None)
+
+    def page(self, direction, values):
+        backward = direction == CURSOR_BACKWARD
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backward))
+        ordering = self.ordering
+        if backward:
+            ordering = tuple(self._reverse(field) for field in ordering)
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backward:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self)
+        has_next = values is not None if backward else has_more
+        has_previous = has_more if backward else values is not None
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(self.encode_cursor(rows[-1], CURSOR_FORWARD)
+                         if has_next else None),
+            previous_cursor=(self.encode_cursor(rows[0], CURSOR_BACKWARD)
+                             if has_previous else None),
+        )
+
+    def _field(self, name):
+        if name == 'pk':
+            return self.object_list.model._meta.pk
+        return self.object_list.model._meta.get_field(name)
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _seek(self, values, backward):
+        """Условие «строго после курсора» в порядке self.ordering.
+
+        Первое поле дополнительно ограничено нестрогим неравенством,
+        чтобы СУБД могла использовать его индекс как диапазон.
+        """
+        lookups = []
+        for field in self.ordering:
+            descending = field.startswith('-')
+            lookups.append('lt' if descending != backward else 'gt')
+        condition = Q()
+        for position, lookup in enumerate(lookups):
+            equal = dict(zip(self.fields[:position], values[:position]))
+            equal[f'{self.fields[position]}__{lookup}'] = values[position]
+            condition |= Q(**equal)
+        first_bound = {f'{self.fields[0]}__{lookups[0]}e': values[0]}
+        return Q(**first_bound) & condition
+
+
+def get_page_count(queryset, request, ordering=('-pub_date', '-id')):
+    if settings.PAGINATION_MODE == 'cursor' or 'cursor' in request.GET:
+        paginator = CursorPaginator(
+            queryset, settings.NUMBER_OF_POSTS, ordering)
+        return paginator.get_page(request.GET.get('cursor'))
     paginator = Paginator(queryset, settings.NUMBER_OF_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now/auto_now_add, чтобы bulk_create взял наши даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
@@ -1,17 +1,35 @@
+import hashlib
+
 from django.conf import settings
+from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from core import routers
+from core.decorators import query_budget, read_replica
 
-from .models import Comment, Follow, Group, Post
-from .forms import CommentForm, PostForm
-from .utils import get_page_count
+from .cache import (AUTHOR_FEED, FOLLOW_FEED, GROUP_FEED, INDEX_PAGE,
+                    cache_page_generation, generation_time, get_generation,
+                    get_generations)
+from . import export
+from . import search as post_search
+from . import threads
+from .models import Comment, Follow, Group, Post, TimelineEntry
+from .forms import CommentForm, PostForm, ReplyForm
+from .utils import CursorPage, CursorPaginator, get_page_count
 
 User = get_user_model()
 
 
-@cache_page(settings.CACHE_TIME, key_prefix='index_page')
+@read_replica
+@query_budget(8)
+@cache_page_generation(settings.CACHE_TIME, key_prefix=INDEX_PAGE)
 def index(request):
     context = {
         'page_obj': get_page_count(Post.objects.select_related(
@@ -20,6 +38,8 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@read_replica
+@query_budget(8)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {
@@ -30,8 +50,11 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@read_replica
+@query_budget(10)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     following = (request.user.is_authenticated
                  and Follow.objects.filter(
                      user=request.user,
@@ -46,18 +69,87 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@read_replica
+@query_budget(8)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    if post_search.is_available():
+        results = post_search.SearchResults(query)
+    else:
+        results = Post.objects.select_related('author', 'group').filter(
+            text__icontains=query) if query else Post.objects.none()
+    paginator = Paginator(results, settings.NUMBER_OF_POSTS)
+    context = {
+        'query': query,
+        'page_query': urlencode({'q': query}) + '&',
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@read_replica
+@query_budget(8)
 def post_detail(request, post_id):
-    user_post = get_object_or_404(Post, id=post_id)
+    user_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     form = CommentForm()
-    comments = Comment.objects.select_related('post').filter(post=user_post)
+    reply_form = ReplyForm(initial={'parent': request.GET.get('reply_to')})
+    comments = _comments_page(request, user_post)
     context = {
         'user_post': user_post,
         'form': form,
-        'comments': comments
+        'reply_form': reply_form,
+        'comments': comments,
+        'thread': _thread(comments)
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_replica
+@query_budget(5)
+def post_comments(request, post_id):
+    """Следующая страница комментариев фрагментом HTML."""
+    user_post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = _comments_page(request, user_post)
+    context = {
+        'user_post': user_post,
+        'comments': comments,
+        'thread': _thread(comments)
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@read_replica
+@query_budget(5)
+def comment_replies(request, post_id, comment_id):
+    """Свернутые ответы на комментарий фрагментом HTML."""
+    comment = get_object_or_404(
+        Comment.objects.select_related('author'),
+        id=comment_id, post_id=post_id)
+    context = {
+        'thread': threads.with_replies(
+            [comment], Comment.objects.select_related('author'),
+            comment.depth + settings.COMMENT_COLLAPSE_DEPTH)[1:]
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def _comments_page(request, post):
+    """Страница корневых комментариев поста."""
+    paginator = CursorPaginator(
+        Comment.objects.select_related('author').filter(
+            post=post, parent=None),
+        settings.NUMBER_OF_COMMENTS, ordering=('-created', '-id'))
+    return paginator.get_page(request.GET.get('comments'))
+
+
+def _thread(comments):
+    return threads.with_replies(
+        comments, Comment.objects.select_related('author'),
+        settings.COMMENT_COLLAPSE_DEPTH)
+
+
+@query_budget(12)
 @login_required
 def post_create(request):
     form = PostForm(
@@ -72,6 +164,7 @@ def post_create(request):
     return redirect('posts:profile', request.user.username)
 
 
+@query_budget(12)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -93,27 +186,60 @@ def post_edit(request, post_id):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(10)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    reply_form = ReplyForm(request.POST or None, post=post)
+    if form.is_valid() and reply_form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = reply_form.cleaned_data['parent']
         form.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def _follow_feed_key(request):
+    """Ключ ленты подписок из последней записи ленты читателя и поколений
+    лент авторов, на которых он подписан.
+
+    Пост, подписка и отписка меняют ключ сами, поэтому при записи не нужно
+    сбрасывать кэш каждого подписчика, а у самого ключа нет поколения.
+    """
+    user_id = request.user.pk
+    newest = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-post_id').values_list('pk', flat=True).first()
+    authors = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True)
+    generations = get_generations(
+        AUTHOR_FEED.format(author_id) for author_id in authors)
+    state = ','.join(sorted(f'{name}={generation}'
+                            for name, generation in generations.items()))
+    digest = hashlib.md5(f'{newest};{state}'.encode()).hexdigest()
+    return FOLLOW_FEED.format(f'{user_id}:{digest}')
+
+
+@read_replica
+@query_budget(8)
 @login_required
+@cache_page_generation(settings.CACHE_TIME, key_prefix=_follow_feed_key,
+                       versioned=False)
 def follow_index(request):
+    page_obj = get_page_count(
+        TimelineEntry.objects.filter(user=request.user).select_related(
+            'post__author', 'post__group'),
+        request,
+        ordering=('-pub_date', '-post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
-        'page_obj': get_page_count(Post.objects.filter(
-            author__following__user=request.user), request)
+        'page_obj': page_obj
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(12)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -122,9 +248,131 @@ def profile_follow(request, username):
     return redirect('posts:profile', username=username)
 
 
+@query_budget(12)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
         Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
+
+
+@query_budget(4)
+@login_required
+def profile_export(request, username, file_format):
+    """Все посты автора с комментариями; доступно автору и сотрудникам."""
+    if file_format not in export.CONTENT_TYPES:
+        raise Http404
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    response = StreamingHttpResponse(
+        export.stream(author.posts.all(), file_format),
+        content_type=export.CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{author.username}.{file_format}"')
+    return response
+
+
+def _feed_generation(request, slug=None, username=None):
+    """Имя поколения ленты; None, если группы или автора нет."""
+    if not hasattr(request, '_feed_generation'):
+        request._feed_generation = _lookup_feed_generation(slug, username)
+    return request._feed_generation
+
+
+def _lookup_feed_generation(slug, username):
+    if slug is not None:
+        group_id = Group.objects.filter(slug=slug).values_list(
+            'pk', flat=True).first()
+        return group_id and GROUP_FEED.format(group_id)
+    if username is not None:
+        author_id = User.objects.filter(username=username).values_list(
+            'pk', flat=True).first()
+        return author_id and AUTHOR_FEED.format(author_id)
+    return INDEX_PAGE
+
+
+def _feed_etag(request, **kwargs):
+    name = _feed_generation(request, **kwargs)
+    if name:
+        return f'{name}:{get_generation(name)}'
+
+
+def _feed_last_modified(request, **kwargs):
+    name = _feed_generation(request, **kwargs)
+    if name:
+        return generation_time(name)
+
+
+feed_condition = condition(
+    etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+
+
+def _post_json(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'image': post.image.url if post.image else None,
+        'thumbnail': post.thumbnail.url if post.thumbnail else None,
+        'comments_count': post.comments_count,
+    }
+
+
+def _page_url(request, page_obj, forward):
+    if isinstance(page_obj, CursorPage):
+        cursor = (page_obj.next_cursor if forward
+                  else page_obj.previous_cursor)
+        query = cursor and {'cursor': cursor}
+    elif forward:
+        query = page_obj.has_next() and {
+            'page': page_obj.next_page_number()}
+    else:
+        query = page_obj.has_previous() and {
+            'page': page_obj.previous_page_number()}
+    return f'{request.path}?{urlencode(query)}' if query else None
+
+
+def _feed_response(request, queryset):
+    # Клиенты кэшируют ответ под ETag поколения: он должен совпадать
+    # с default, а не с отстающей репликой.
+    with routers.primary():
+        page_obj = get_page_count(queryset, request)
+        results = [_post_json(post) for post in page_obj]
+    return JsonResponse({
+        'results': results,
+        'next': _page_url(request, page_obj, forward=True),
+        'previous': _page_url(request, page_obj, forward=False),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@read_replica
+@query_budget(4)
+@cache_control(public=True, max_age=0)
+@feed_condition
+def api_index(request):
+    return _feed_response(
+        request, Post.objects.select_related('author', 'group'))
+
+
+@read_replica
+@query_budget(6)
+@cache_control(public=True, max_age=0)
+@feed_condition
+def api_group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed_response(
+        request, group.posts.select_related('author', 'group'))
+
+
+@read_replica
+@query_budget(6)
+@cache_control(public=True, max_age=0)
+@feed_condition
+def api_profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return _feed_response(
+        request, author.posts.select_related('author', 'group'))
@@ -41,7 +41,6 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 LOGIN_URL = 'users:login'
@@ -55,21 +54,74 @@ PASSWORD_RESET_URL = 'users:password_reset'
 PASSWORD_RESET_DONE = 'users:password_reset_done'
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
+# Отладочная панель только для разработки.
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('core.middleware.QueryBudgetMiddleware'),
+        'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Профили запросов (core.middleware.ProfilingMiddleware); None — выключено.
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Доля случайных запросов, которые профилируются всегда.
+PROFILING_SAMPLE_RATE = 0.0
+
+# Сколько секунд действует подписанный заголовок X-Profile.
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# Файлы метрик процессов для /metrics (core.metrics); None — выключено.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Кому отдавать /metrics; None — всем.
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# 'raise' — исключение при превышении @query_budget, 'log' — запись
+# в лог, None — проверка отключена.
+QUERY_BUDGET_MODE = 'raise' if DEBUG else 'log'
+
+QUERY_BUDGET_IGNORED_TABLES = ()
+
 NUMBER_OF_POSTS = 10
 
+# 'page' — нумерованные страницы, 'cursor' — keyset-пагинация по курсору.
+PAGINATION_MODE = 'page'
+
 SHOW_POST_NUMBER_OF_CHARACTERS = 15
 
-CACHE_TIME = 20
+CACHE_TIME = 60 * 60 * 3
+
+NUMBER_OF_FEED_POSTS = 20
+
+NUMBER_OF_COMMENTS = 20
+
+# Глубина ветки комментариев: ответы глубже COMMENT_MAX_DEPTH
+# становятся соседями родителя, а глубже COMMENT_COLLAPSE_DEPTH
+# подгружаются по кнопке. Корневой комментарий имеет глубину 0.
+COMMENT_MAX_DEPTH = 10
+
+COMMENT_COLLAPSE_DEPTH = 3
+
+TIMELINE_BATCH_SIZE = 500
+
+# Потоки для генерации миниатюр внутри веб-процесса; при 0 миниатюры
+# строит отдельный процесс manage.py generate_thumbnails --watch.
+POST_THUMBNAIL_WORKERS = 0
 
 ROOT_URLCONF = 'yatube.urls'
 
@@ -77,7 +129,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -102,6 +154,36 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения в view с @read_replica (core.routers), например
+# копия SQLite-файла, которую обновляет репликация:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_READ_ALIAS = 'replica'
+DATABASE_READ_ALIAS = None
+
+DATABASE_ROUTERS = ['core.routers.ReadReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной базы.
+REPLICA_PIN_SECONDS = 10
+
+# Через сколько секунд снова пробовать отказавшую реплику.
+REPLICA_RETRY_SECONDS = 30
+
+# PRAGMA для каждого нового соединения с SQLite (core.signals).
+# WAL позволяет читать во время записи, busy_timeout — ждать блокировку
+# вместо ошибки database is locked; cache_size в КиБ со знаком минус.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -142,14 +224,44 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
 CACHES = {
+    # Небольшой LRU в памяти процесса поверх общего для всех процессов
+    # файлового кэша; изменения ключей расходятся по журналу.
     'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_MAX_ENTRIES': 500,
+            'L1_TIMEOUT': 5,
+            'JOURNAL': os.path.join(CACHE_DIR, 'journal'),
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'shared'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Фрагменты постов: ключ зависит от Post.modified, поэтому записи
+    # не устаревают и вытесняются только по MAX_ENTRIES.
+    'template_fragments': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'LOCATION': 'template_fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# manage.py test: кэш, метрики и медиа во временном каталоге, а не в
+# CACHE_DIR, METRICS_DIR и MEDIA_ROOT; для py.test — tests/conftest.py.
+TEST_RUNNER = 'core.runner.IsolatedTestRunner'
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]